@@ -1,6 +1,40 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save
 
 
 class MainConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "main"
+
+    def ready(self):
+        from .data_version import TRACKED_MODELS, mark_data_changed
+        from .field_registry import build_field_registry
+        from .membership import release_values
+        from .viewer_links import (LINKED_MODELS, mark_links_changed,
+                                   refresh_pending_links)
+
+        for model_name in TRACKED_MODELS:
+            model = self.get_model(model_name)
+            post_save.connect(
+                mark_data_changed, sender=model,
+                dispatch_uid=f"data_version_save_{model_name}")
+            post_delete.connect(
+                mark_data_changed, sender=model,
+                dispatch_uid=f"data_version_delete_{model_name}")
+
+        for model_name in LINKED_MODELS:
+            model = self.get_model(model_name)
+            post_save.connect(
+                mark_links_changed, sender=model,
+                dispatch_uid=f"viewer_links_save_{model_name}")
+            post_delete.connect(
+                mark_links_changed, sender=model,
+                dispatch_uid=f"viewer_links_delete_{model_name}")
+
+        request_finished.connect(
+            release_values, dispatch_uid="membership_release_values")
+        request_finished.connect(
+            refresh_pending_links, dispatch_uid="viewer_links_refresh")
+
+        build_field_registry()
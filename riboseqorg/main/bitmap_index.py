@@ -0,0 +1,206 @@
+import threading
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from .data_version import get_data_version
+from .filter_compiler import MISSING_VALUES, TOGGLE_FIELDS
+from .models import Sample, Study
+
+# Number of set bits in each possible byte
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+SAMPLE_INDEX_FIELDS = [
+    'CELL_LINE',
+    'INHIBITOR',
+    'TISSUE',
+    'LIBRARYTYPE',
+    'ScientificName',
+    'Sex',
+    *TOGGLE_FIELDS,
+]
+
+STUDY_INDEX_FIELDS = [
+    'ScientificName',
+    'PMID',
+]
+
+
+class BitmapIndex:
+    '''
+    In-memory bitmap index over the low-cardinality columns of a table.
+
+    Each distinct value of an indexed field has a bitset with one bit per
+    row, so a filter that ORs options within a field and ANDs fields
+    together is a handful of vectorised byte operations, and counting the
+    rows of every facet value is a popcount over a single array.
+    '''
+
+    def __init__(self, ids: Iterable, columns: Dict[str, List]):
+        '''
+        Arguments:
+        - ids (iterable): the primary keys of the rows
+        - columns (dict): the value of each row keyed by field name
+        '''
+        self.ids = np.asarray(list(ids))
+        self.size = len(self.ids)
+        self.full = np.packbits(np.ones(self.size, dtype=bool))
+        self.values: Dict[str, List] = {}
+        self.codes: Dict[str, dict] = {}
+        self.bitmaps: Dict[str, np.ndarray] = {}
+
+        for field, column in columns.items():
+            codes: dict = {}
+            row_codes = np.fromiter(
+                (codes.setdefault(value, len(codes)) for value in column),
+                dtype=np.int64,
+                count=self.size,
+                )
+            bitmaps = np.zeros((len(codes), len(self.full)), dtype=np.uint8)
+            for code in range(len(codes)):
+                bitmaps[code] = np.packbits(row_codes == code)
+            self.values[field] = list(codes)
+            self.codes[field] = codes
+            self.bitmaps[field] = bitmaps
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.bitmaps)
+
+    def any_of(self, field: str, options: Iterable) -> np.ndarray:
+        '''
+        Return the bitset of rows where field has one of the options.
+        '''
+        codes = self.codes[field]
+        if all(isinstance(value, bool) for value in codes):
+            options = [
+                option if isinstance(option, bool)
+                else str(option).lower() in ('true', '1', 'on')
+                for option in options
+            ]
+        rows = [codes[option] for option in options if option in codes]
+        if not rows:
+            return np.zeros_like(self.full)
+        return np.bitwise_or.reduce(self.bitmaps[field][rows], axis=0)
+
+    def mask(self, selection: Dict[str, list], exclude: str = None
+             ) -> np.ndarray:
+        '''
+        Return the bitset of rows matching the selection on every field
+        other than exclude.
+        '''
+        mask = self.full.copy()
+        for field, options in selection.items():
+            if field != exclude:
+                mask &= self.any_of(field, options)
+        return mask
+
+    def match(self, selection: Dict[str, list]) -> np.ndarray:
+        '''
+        Return the primary keys of the rows matching the selection, in
+        primary key order.
+        '''
+        rows = np.unpackbits(self.mask(selection), count=self.size)
+        return self.ids[rows.astype(bool)]
+
+    def count(self, selection: Dict[str, list]) -> int:
+        '''
+        Return the number of rows matching the selection.
+        '''
+        return int(POPCOUNT[self.mask(selection)].sum())
+
+    def facet_counts(
+            self,
+            selection: Dict[str, list],
+            facet_fields: List[str]) -> Dict[str, List[dict]]:
+        '''
+        Count the values of each facet field.
+
+        Each facet is counted over the rows matching the selection on every
+        other field, so that the options of a multi-select facet remain
+        visible once one of them is chosen.
+
+        Arguments:
+        - selection (dict): the selected options keyed by field
+        - facet_fields (list): the fields to count values for
+
+        Returns:
+        - (dict): lists of {'value', 'count'} keyed by facet field, most
+            frequent first
+        '''
+        facets = {}
+        for field in facet_fields:
+            mask = self.mask(selection, exclude=field)
+            counts = POPCOUNT[self.bitmaps[field] & mask].sum(axis=1)
+            merged: dict = {}
+            for value, count in zip(self.values[field], counts.tolist()):
+                if count:
+                    value = 'None' if value in MISSING_VALUES else value
+                    merged[value] = merged.get(value, 0) + count
+            facets[field] = [
+                {'value': value, 'count': count}
+                for value, count in sorted(
+                    merged.items(), key=lambda item: -item[1])
+            ]
+        return facets
+
+
+def build_sample_index() -> BitmapIndex:
+    '''
+    Build the bitmap index over the Sample filter panel fields.
+    '''
+    rows = list(Sample.objects.order_by('pk').values_list(
+        'pk', *SAMPLE_INDEX_FIELDS))
+    return BitmapIndex([row[0] for row in rows], {
+        field: [row[i] for row in rows]
+        for i, field in enumerate(SAMPLE_INDEX_FIELDS, start=1)
+    })
+
+
+def build_study_index() -> BitmapIndex:
+    '''
+    Build the bitmap index over the Study filter panel fields. PMID is
+    indexed by availability rather than by value.
+    '''
+    rows = list(Study.objects.order_by('pk').values_list(
+        'pk', *STUDY_INDEX_FIELDS))
+    return BitmapIndex([row[0] for row in rows], {
+        'ScientificName': [row[1] for row in rows],
+        'PMID': [row[2] not in MISSING_VALUES for row in rows],
+    })
+
+
+_builders = {
+    'sample': build_sample_index,
+    'study': build_study_index,
+}
+_indexes: dict = {}
+_lock = threading.Lock()
+
+
+def get_index(name: str) -> BitmapIndex:
+    '''
+    Return the named index, rebuilding it if the data has changed since it
+    was built.
+
+    Arguments:
+    - name (str): 'sample' or 'study'
+
+    Returns:
+    - (BitmapIndex): the index
+    '''
+    version = get_data_version()
+    with _lock:
+        built = _indexes.get(name)
+        if built is None or built[0] != version:
+            built = (version, _builders[name]())
+            _indexes[name] = built
+    return built[1]
+
+
+def get_sample_index() -> BitmapIndex:
+    return get_index('sample')
+
+
+def get_study_index() -> BitmapIndex:
+    return get_index('study')
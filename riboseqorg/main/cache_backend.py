@@ -0,0 +1,172 @@
+import pickle
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.redis import RedisSerializer
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, Sum
+
+COMPRESS_LEVEL = 6
+
+
+def dumps(value, level: int = COMPRESS_LEVEL) -> bytes:
+    return zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), level)
+
+
+def loads(data) -> object:
+    return pickle.loads(zlib.decompress(data))
+
+
+class CompressedRedisSerializer(RedisSerializer):
+    '''
+    Serializer compressing the pickled values stored in Redis. Integers are
+    stored as is so that incr and decr keep working on the server.
+    '''
+
+    def dumps(self, obj):
+        if type(obj) is int:
+            return obj
+        return dumps(obj)
+
+    def loads(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            return loads(data)
+
+
+class SharedCache(BaseCache):
+    '''
+    Cache backend keeping its entries in a database table, so that they are
+    shared by every worker process and need no extra service. The table is
+    routed to its own database (see routers.py).
+
+    Values are pickled and compressed. Every CULL_EVERY writes, if the cache
+    holds more than MAX_ENTRIES entries or MAX_BYTES of compressed values,
+    expired entries and then the least recently read ones are evicted.
+
+    Options:
+    - MAX_ENTRIES (int): the maximum number of entries (default 300)
+    - MAX_BYTES (int): the maximum size of the stored values (default 64MB)
+    - CULL_EVERY (int): the writes between checks of the limits, which
+        may be exceeded in between (default 50)
+    - COMPRESS_LEVEL (int): the zlib compression level
+    - TOUCH_INTERVAL (int): the seconds before a read of an entry is
+        recorded again, to avoid a write on every hit
+    '''
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._compress_level = int(
+            options.get('COMPRESS_LEVEL', COMPRESS_LEVEL))
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 60))
+        self._cull_every = int(options.get('CULL_EVERY', 50))
+        self._writes = 0
+
+    @staticmethod
+    def _entries():
+        # imported here as cache backends may be loaded before the apps
+        from .models import CacheEntry
+        return CacheEntry.objects
+
+    def _live(self, key):
+        return self._entries().filter(key=key).exclude(
+            expires__lte=time.time())
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._live(key).values_list('value', 'accessed').first()
+        if row is None:
+            return default
+        value, accessed = row
+        now = time.time()
+        if now - accessed > self._touch_interval:
+            self._entries().filter(key=key).update(accessed=now)
+        return loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if self._live(key).exists():
+            return False
+        return self._write(key, value, timeout)
+
+    def _write(self, key, value, timeout) -> bool:
+        data = dumps(value, self._compress_level)
+        fields = {
+            'value': data,
+            'size': len(data),
+            'expires': self.get_backend_timeout(timeout),
+            'accessed': time.time(),
+        }
+        entries = self._entries()
+        try:
+            with transaction.atomic(using=router.db_for_write(entries.model)):
+                if not entries.filter(key=key).update(**fields):
+                    entries.create(key=key, **fields)
+        except IntegrityError:
+            # another worker wrote the key first
+            return False
+        self._writes += 1
+        if self._writes % self._cull_every == 0:
+            self._cull()
+        return True
+
+    def _cull(self) -> None:
+        '''
+        Evict expired entries, then the least recently read ones, until the
+        cache is within its limits.
+        '''
+        totals = self._entries().aggregate(count=Count('pk'), size=Sum('size'))
+        count, size = totals['count'], totals['size'] or 0
+        if count <= self._max_entries and size <= self._max_bytes:
+            return
+        self.delete_expired()
+
+        totals = self._entries().aggregate(count=Count('pk'), size=Sum('size'))
+        count, size = totals['count'], totals['size'] or 0
+        evicted = []
+        entries = self._entries().order_by('accessed').values_list('pk', 'size')
+        for pk, entry_size in entries.iterator():
+            if count <= self._max_entries and size <= self._max_bytes:
+                break
+            evicted.append(pk)
+            count -= 1
+            size -= entry_size
+        for start in range(0, len(evicted), 500):
+            self._entries().filter(pk__in=evicted[start:start + 500]).delete()
+
+    def delete_expired(self) -> int:
+        '''
+        Delete the expired entries, returning how many there were.
+        '''
+        return self._entries().filter(expires__lte=time.time()).delete()[0]
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(self._live(key).update(
+            expires=self.get_backend_timeout(timeout)))
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(self._entries().filter(key=key).delete()[0])
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._live(key).exists()
+
+    def clear(self):
+        self._entries().all().delete()
+
+    def stats(self) -> dict:
+        '''
+        Return the number of entries and the size of their values.
+        '''
+        totals = self._entries().aggregate(count=Count('pk'), size=Sum('size'))
+        return {'entries': totals['count'], 'bytes': totals['size'] or 0}
@@ -0,0 +1,82 @@
+import time
+from itertools import count
+from typing import Tuple
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+# Models whose rows feed the portal's indexes and caches
+TRACKED_MODELS = ['Sample', 'Study', 'Trips', 'GWIPS', 'RiboCrypt']
+
+# Seconds the database version is reused before being read again, so that
+# other processes' commits are seen within this delay
+VERSION_TTL = 2.0
+
+_change_ids = count(1)
+_database_version = {'version': 0, 'expires': 0.0}
+
+
+def get_data_version() -> Tuple[int, int]:
+    '''
+    Return the current data version.
+
+    The first element is the database counter shared by every process,
+    read at most every VERSION_TTL seconds. The second identifies the
+    latest change made by this connection that is not committed yet (0 if
+    there is none), so that the connection sees its own changes before its
+    transaction commits; it is never reused, so a rolled back transaction
+    cannot leave behind entries a later one would match.
+
+    Returns:
+    - (tuple): the database and local versions
+    '''
+    now = time.monotonic()
+    if now >= _database_version['expires']:
+        version = DataVersion.objects.values_list(
+            'version', flat=True).first()
+        _database_version['version'] = version or 0
+        _database_version['expires'] = now + VERSION_TTL
+    return (_database_version['version'], _local_change())
+
+
+def _local_change() -> int:
+    # A change is pending while the bump it registered has not run: once
+    # the transaction commits the bump resets it, and a rollback discards
+    # the bump along with the change
+    change = getattr(connection, 'data_change', 0)
+    if change and not _bump_pending():
+        connection.data_change = change = 0
+    return change
+
+
+def _bump_pending() -> bool:
+    pending = [entry[1] for entry in connection.run_on_commit]
+    return bump_data_version in pending
+
+
+def bump_data_version() -> None:
+    '''
+    Increment the database data version, creating the row if needed.
+
+    The local changes are then part of the database version, so the local
+    version is reset and every process agrees on the version again (which
+    lets them share cache entries keyed by it).
+    '''
+    if not DataVersion.objects.update(version=F('version') + 1):
+        DataVersion.objects.create(version=1)
+    _database_version['expires'] = 0.0
+    connection.data_change = 0
+
+
+def mark_data_changed(sender, **kwargs) -> None:
+    '''
+    Signal handler recording that portal data has changed.
+
+    Loading a fixture saves every object inside one transaction, so the
+    database version is bumped once, when that transaction commits.
+    '''
+    connection.data_change = next(_change_ids)
+    if not _bump_pending():
+        transaction.on_commit(bump_data_version)
@@ -0,0 +1,133 @@
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .membership import chunked
+from .models import ARTIFACT_SUFFIXES, SERVER_BASE, Artifact, artifact_url
+from .page_cache import canonical_selection
+
+DOWNLOAD_BASE_URL = "https://rdp.ucc.ie"
+
+# Where download scripts used to be written, kept tidy by clean_download_files
+DOWNLOAD_FILES_DIR = f"{SERVER_BASE}/download_files"
+
+# content type and file extension of each manifest format
+DOWNLOAD_MODES = {
+    'sh': ('text/x-shellscript', 'sh'),
+    'urls': ('text/plain', 'txt'),
+    'aria2c': ('text/plain', 'aria2c.txt'),
+    'md5': ('text/plain', 'md5'),
+}
+
+# requested file types that cover several artifact types
+FILE_TYPE_GROUPS = {
+    'bigwigs': ['bigwig (forward)', 'bigwig (reverse)'],
+}
+
+LINES_PER_CHUNK = 500
+
+SCRIPT_HEADER = (
+    "#!/bin/bash\n\n"
+    "# Base URL\n"
+    f"BASE_URL=\"{DOWNLOAD_BASE_URL}\"\n\n"
+    "# Array of file paths\n"
+    "FILES=(\n"
+)
+
+SCRIPT_FOOTER = (
+    ")\n\n"
+    "if [ ${#FILES[@]} -eq 0 ]; then\n"
+    "  echo 'No files available for download'\n"
+    "  exit 0\n"
+    "fi\n\n"
+    "# Download function\n"
+    "download_file() {\n"
+    "  local url=\"$BASE_URL$1\"\n"
+    "  echo \"Downloading: $url\"\n"
+    "  wget -c \"$url\"\n"
+    "}\n\n"
+    "# Main loop\n"
+    "for file in \"${FILES[@]}\"; do\n"
+    "  download_file \"$file\"\n"
+    "done\n\n"
+    "echo \"All downloads completed!\"\n"
+)
+
+
+def download_file_types(file_type: str) -> Optional[List[str]]:
+    '''
+    Return the artifact types of a requested file type, or None if it is
+    not known.
+    '''
+    if file_type in FILE_TYPE_GROUPS:
+        return FILE_TYPE_GROUPS[file_type]
+    if file_type in ARTIFACT_SUFFIXES:
+        return [file_type]
+    return None
+
+
+def manifest_name(selection: Dict[str, list], mode: str) -> str:
+    '''
+    Return the file name of a manifest, derived from its content: the
+    canonical selection (including the file type) and the format.
+    '''
+    digest = hashlib.sha1(
+        f"{mode}:{canonical_selection(selection)}".encode('utf8')
+        ).hexdigest()[:16]
+    return f"RiboSeqOrg_Download_{digest}.{DOWNLOAD_MODES[mode][1]}"
+
+
+def manifest_artifacts(samples, file_types: List[str]) -> Iterable[tuple]:
+    '''
+    Read the artifacts of the selected samples from the artifact manifest in
+    one query, in run order.
+
+    Arguments:
+    - samples (QuerySet): the selected samples
+    - file_types (list): the artifact types to download
+
+    Returns:
+    - (iterable): (run, file type, file name, md5) rows
+    '''
+    return Artifact.objects.filter(
+        Run__in=samples.values('Run'), file_type__in=file_types,
+        ).order_by('Run', 'file_type').values_list(
+            'Run', 'file_type', 'file_name', 'md5').iterator()
+
+
+def _manifest_line(mode: str, run, file_type, file_name, md5) -> str:
+    url = artifact_url(run, file_type, file_name)
+    if mode == 'sh':
+        return f'  "{url[len(DOWNLOAD_BASE_URL):]}"\n'
+    if mode == 'aria2c' and md5:
+        return f"{url}\n  checksum=md5={md5}\n"
+    if mode == 'md5':
+        # md5sum -c can only check files with a known checksum
+        return f"{md5}  {file_name}\n" if md5 else ''
+    return f"{url}\n"
+
+
+def manifest_chunks(artifacts: Iterable[tuple], mode: str) -> Iterator[str]:
+    '''
+    Generate a download manifest in chunks of lines.
+
+    Formats:
+    - sh: a bash script downloading the files with wget
+    - urls: one URL per line, for wget -i or aria2c -i
+    - aria2c: URLs with their MD5 checksum as aria2c options, so that
+        aria2c -i verifies the downloads
+    - md5: checksums of the files in the format of md5sum -c
+
+    Arguments:
+    - artifacts (iterable): (run, file type, file name, md5) rows
+    - mode (str): the format, a key of DOWNLOAD_MODES
+
+    Returns:
+    - (iterator): the manifest, in chunks
+    '''
+    if mode == 'sh':
+        yield SCRIPT_HEADER
+    lines = (_manifest_line(mode, *artifact) for artifact in artifacts)
+    for chunk in chunked(lines, LINES_PER_CHUNK):
+        yield ''.join(chunk)
+    if mode == 'sh':
+        yield SCRIPT_FOOTER
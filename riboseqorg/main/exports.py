@@ -0,0 +1,187 @@
+import csv
+import json
+import zlib
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+from .field_registry import get_model_fields
+from .models import Sample, get_artifact_links
+from .utilities import Echo
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for the columnar formats
+    pa = None
+    pq = None
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder is used instead
+    orjson = None
+
+# Download formats, mapped to their content type and file extension
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'tsv.gz': ('application/gzip', 'tsv.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', 'arrow'),
+}
+
+COLUMNAR_FORMATS = ['parquet', 'arrow']
+
+BATCH_SIZE = 10000
+
+
+def columnar_available() -> bool:
+    return pa is not None
+
+
+def arrow_type(field_name: str):
+    '''
+    Return the Arrow type used to export a Sample field. Short text fields
+    are dictionary encoded as they hold few distinct values; fields that
+    are not model fields (eg. the link properties) are plain strings.
+
+    Arguments:
+    - field_name (str): the field name
+
+    Returns:
+    - (pa.DataType): the Arrow type
+    '''
+    field = get_model_fields(Sample).by_name.get(field_name)
+    if field is None:
+        return pa.string()
+    internal_type = field.internal_type
+    if internal_type in ('IntegerField', 'BigAutoField', 'AutoField'):
+        return pa.int64()
+    if internal_type == 'BooleanField':
+        return pa.bool_()
+    if internal_type == 'TextField':
+        return pa.string()
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def rows_to_table(fields: List[str], rows: Iterable[tuple]):
+    '''
+    Build an Arrow table from rows of field values, converting them in
+    batches and sharing one dictionary per column across batches.
+
+    Arguments:
+    - fields (list): the column names
+    - rows (iterable): the values of each row, in fields order
+
+    Returns:
+    - (pa.Table): the table
+    '''
+    schema = pa.schema([(field, arrow_type(field)) for field in fields])
+
+    def to_batch(batch_rows):
+        arrays = []
+        for field, values in zip(schema, zip(*batch_rows)):
+            if pa.types.is_dictionary(field.type):
+                array = pa.array(values, type=pa.string()).dictionary_encode()
+            else:
+                array = pa.array(values, type=field.type)
+            arrays.append(array)
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    batches = []
+    batch_rows = []
+    for row in rows:
+        batch_rows.append(row)
+        if len(batch_rows) == BATCH_SIZE:
+            batches.append(to_batch(batch_rows))
+            batch_rows = []
+    if batch_rows:
+        batches.append(to_batch(batch_rows))
+    return pa.Table.from_batches(batches, schema=schema).unify_dictionaries()
+
+
+def table_to_bytes(table, file_format: str) -> bytes:
+    '''
+    Serialise an Arrow table as a Parquet or Arrow IPC file.
+    '''
+    sink = pa.BufferOutputStream()
+    if file_format == 'parquet':
+        pq.write_table(table, sink, compression='zstd')
+    else:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def delimited_lines(fields: List[str], rows: Iterable[tuple],
+                    delimiter: str = ',') -> Iterator[str]:
+    '''
+    Yield the lines of a delimited text file, header first.
+    '''
+    writer = csv.writer(Echo(), delimiter=delimiter)
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def gzip_stream(lines: Iterable[str]) -> Iterator[bytes]:
+    '''
+    Gzip compress text lines as they are produced.
+    '''
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for line in lines:
+        chunk = compressor.compress(line.encode('utf8'))
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def json_bytes(value) -> bytes:
+    '''
+    Encode a value as compact UTF-8 JSON, with orjson when it is installed.
+    '''
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(
+        value, ensure_ascii=False, separators=(',', ':')).encode('utf8')
+
+
+def sample_records(queryset, fields: List[str]) -> Iterator[dict]:
+    '''
+    Yield the given fields of each sample as a dict, reading value tuples
+    as they are fetched rather than building model instances. Fields that
+    are not model fields (the link properties) are looked up per batch of
+    rows (see get_artifact_links).
+
+    Arguments:
+    - queryset (QuerySet): the samples to read
+    - fields (list): the fields to return, in output order
+
+    Returns:
+    - (Iterator[dict]): the fields of each sample
+    '''
+    model_fields = get_model_fields(Sample).concrete_names
+    columns = [field for field in fields if field in model_fields]
+    properties = [field for field in fields if field not in model_fields]
+    rows = queryset.values_list('Run', *columns).iterator(
+        chunk_size=BATCH_SIZE)
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        links = get_artifact_links(row[0] for row in batch) \
+            if properties else {}
+        for run, *values in batch:
+            record = dict(zip(columns, values))
+            if properties:
+                sample = Sample(Run=run)
+                sample.__dict__['artifact_links'] = links[run]
+                for field in properties:
+                    record[field] = getattr(sample, field)
+            yield {field: record[field] for field in fields}
+
+
+def ndjson_lines(records: Iterable[dict]) -> Iterator[bytes]:
+    '''
+    Yield records as newline delimited JSON.
+    '''
+    for record in records:
+        yield json_bytes(record) + b'\n'
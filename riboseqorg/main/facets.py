@@ -0,0 +1,28 @@
+from typing import Dict, List, Type
+
+from django.db.models import Model
+from django.http import HttpRequest
+
+from .filter_compiler import filter_spec
+from .models import Sample
+
+
+def parse_selection(
+        request: HttpRequest,
+        fields: List[str],
+        model: Type[Model] = Sample) -> Dict[str, tuple]:
+    '''
+    Read the filter panel selection from the request.
+
+    Parameters are named by clean name (eg. 'Cell-Line') except for the
+    toggles, which are named by field and are set when their value is 'on'.
+
+    Arguments:
+    - request (HttpRequest): the HTTP request for the page
+    - fields (list): the original field names that may be filtered on
+    - model (Model): the model filtered, Sample or Study
+
+    Returns:
+    - (dict): the canonical filter spec of the selection
+    '''
+    return filter_spec(request.GET.lists(), model, fields)
@@ -0,0 +1,91 @@
+from types import MappingProxyType
+from typing import Dict, NamedTuple, Tuple, Type
+
+from django.db.models import Model
+
+
+class FieldInfo(NamedTuple):
+    name: str
+    internal_type: str
+    clean_name: str
+    concrete: bool
+    is_relation: bool
+    facetable: bool
+    searchable: bool
+
+
+class ModelFields:
+    '''
+    Immutable metadata of the fields of a model, built once so that request
+    handling does not scan Model._meta.
+
+    Attributes:
+    - names (tuple): every field name, in Model._meta.get_fields() order
+    - concrete_names (tuple): the names of the fields stored in the table
+    - facetable (frozenset): the fields of the filter panel index
+    - searchable (tuple): the full-text indexed fields, by weight
+    - by_name (mapping): the FieldInfo of each field
+    '''
+
+    def __init__(self, model: Type[Model], clean_names: Dict[str, str],
+                 facetable, searchable):
+        searchable = tuple(searchable)
+        fields = tuple(
+            FieldInfo(
+                name=field.name,
+                internal_type=field.get_internal_type(),
+                clean_name=clean_names.get(field.name, field.name),
+                concrete=field.concrete,
+                is_relation=field.is_relation,
+                facetable=field.name in facetable,
+                searchable=field.name in searchable,
+            )
+            for field in model._meta.get_fields()
+        )
+        self.model = model
+        self.names = tuple(field.name for field in fields)
+        self.concrete_names = tuple(
+            field.name for field in fields if field.concrete)
+        self.facetable = frozenset(facetable)
+        self.searchable = searchable
+        self.by_name = MappingProxyType(
+            {field.name: field for field in fields})
+        self._name_set = frozenset(self.names)
+
+    def __contains__(self, name) -> bool:
+        return name in self._name_set
+
+    def __iter__(self):
+        return iter(self.by_name.values())
+
+    def names_excluding(self, exclude) -> Tuple[str, ...]:
+        return tuple(name for name in self.names if name not in exclude)
+
+
+_registry: Dict[str, ModelFields] = {}
+
+
+def build_field_registry() -> None:
+    '''
+    Build the field metadata of Sample and Study. Called when the app is
+    ready.
+    '''
+    from .bitmap_index import SAMPLE_INDEX_FIELDS, STUDY_INDEX_FIELDS
+    from .models import Sample, Study
+    from .search import search_fields
+    from .utilities import get_clean_names
+
+    clean_names = get_clean_names()
+    _registry['sample'] = ModelFields(
+        Sample, clean_names, SAMPLE_INDEX_FIELDS, search_fields(Sample))
+    _registry['study'] = ModelFields(
+        Study, clean_names, STUDY_INDEX_FIELDS, search_fields(Study))
+
+
+def get_model_fields(model: Type[Model]) -> ModelFields:
+    '''
+    Return the field metadata of Sample or Study.
+    '''
+    if not _registry:
+        build_field_registry()
+    return _registry[model._meta.model_name]
@@ -0,0 +1,113 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+from urllib.parse import parse_qsl
+
+from django.db.models import Model, Q
+
+from .field_registry import get_model_fields
+from .models import Sample
+from .utilities import VOCABULARY
+
+TOGGLE_FIELDS = [
+    'trips_id',
+    'gwips_id',
+    'ribocrypt_id',
+    'FASTA_file',
+    'verified',
+]
+
+MISSING_VALUES = ['', 'nan', None]
+
+# Values of a toggle parameter that mean it is set
+TRUE_VALUES = ['on', 'True', 'true', '1']
+
+# Study fields filtered by whether they have a value ('Available' or
+# 'Not Available'). Samples are filtered on the field of their study.
+AVAILABILITY_FIELDS = ['PMID']
+
+
+def filter_spec(
+        params: Iterable[Tuple[str, List[str]]],
+        model: Type[Model] = Sample,
+        fields: Optional[List[str]] = None) -> Dict[str, tuple]:
+    '''
+    Turn filter parameters into a canonical filter spec.
+
+    Parameters may use clean names (eg. 'Cell-Line'), original names or
+    aliases. Names that are not filters of the model are dropped, toggles
+    and availability fields become booleans, and the fields and options
+    are sorted and de-duplicated, so that equivalent requests give equal
+    specs.
+
+    Arguments:
+    - params (iterable): (name, options) pairs, eg. request.GET.lists()
+    - model (Model): Sample or Study
+    - fields (list): if given, the only original field names to keep
+
+    Returns:
+    - (dict): the options of each original field name, as sorted tuples
+    '''
+    known = get_model_fields(model)
+    spec: Dict[str, set] = {}
+    for name, options in params:
+        field = VOCABULARY.original(name)
+        if fields is not None and field not in fields:
+            continue
+        if field not in known and field not in AVAILABILITY_FIELDS:
+            continue
+        if not options:
+            continue
+        if field in TOGGLE_FIELDS:
+            options = [option in TRUE_VALUES for option in options]
+        elif field in AVAILABILITY_FIELDS:
+            options = [option == 'Available' for option in options]
+        spec.setdefault(field, set()).update(options)
+    return {
+        field: tuple(sorted(options, key=str))
+        for field, options in sorted(spec.items())
+    }
+
+
+def querystring_spec(
+        query_string: str, model: Type[Model] = Sample) -> Dict[str, tuple]:
+    '''
+    Build the filter spec of a URL encoded query string (eg. the filters
+    of a table passed on to a download or links request).
+    '''
+    params: Dict[str, list] = {}
+    for name, value in parse_qsl(query_string):
+        params.setdefault(name, []).append(value)
+    return filter_spec(params.items(), model)
+
+
+def compile_filter(
+        spec: Dict[str, tuple], model: Type[Model] = Sample) -> Q:
+    '''
+    Compile a filter spec into a single predicate: an IN list per field,
+    ANDed together. Each call builds a new predicate, so callers may
+    combine or modify it.
+
+    Arguments:
+    - spec (dict): the options of each original field name
+    - model (Model): the model filtered, Sample or Study
+
+    Returns:
+    - (Q): the predicate
+    '''
+    query = Q()
+    for field, options in spec.items():
+        if field in AVAILABILITY_FIELDS:
+            lookup = field if model._meta.model_name == 'study' \
+                else f'BioProject__{field}'
+            query &= _availability(lookup, options)
+        else:
+            query &= Q(**{f'{field}__in': list(options)})
+    return query
+
+
+def _availability(lookup: str, options: tuple) -> Q:
+    missing = Q(**{f'{lookup}__in': MISSING_VALUES[:-1]}) \
+        | Q(**{f'{lookup}__isnull': True})
+    if set(options) == {True, False}:
+        return Q()
+    return ~missing if True in options else missing
+
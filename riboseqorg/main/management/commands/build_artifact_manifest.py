@@ -0,0 +1,91 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.data_version import bump_data_version
+from main.models import ARTIFACT_DIRS, ARTIFACT_SUFFIXES, SERVER_BASE, Artifact
+from main.utilities import file_md5
+
+
+def scan_artifacts(server_base: str) -> dict:
+    '''
+    Walk the processed file directories once and record the file available
+    for each run and artifact type. As in generate_link, a file named after
+    the run takes precedence over its "_1" mate.
+
+    Arguments:
+    - server_base (str): the root of the data volume
+
+    Returns:
+    - (dict): file names keyed by (run, artifact type)
+    '''
+    dir_types: dict = {}
+    for file_type, directory in ARTIFACT_DIRS.items():
+        dir_types.setdefault(directory, []).append(file_type)
+
+    found: dict = {}
+    for directory, file_types in dir_types.items():
+        root = os.path.join(server_base, directory)
+        if not os.path.isdir(root):
+            continue
+        for prefix in os.scandir(root):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                for file_type in file_types:
+                    suffix = ARTIFACT_SUFFIXES[file_type]
+                    if not entry.name.endswith(suffix):
+                        continue
+                    run = entry.name[:-len(suffix)]
+                    is_mate = run.endswith('_1')
+                    if is_mate:
+                        run = run[:-2]
+                    if run[:6] != prefix.name:
+                        continue
+                    key = (run, file_type)
+                    if key not in found or not is_mate:
+                        found[key] = entry.name
+    return found
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Artifact manifest from the processed file directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base',
+            default=SERVER_BASE,
+            help='Root of the data volume to scan',
+            )
+        parser.add_argument(
+            '--checksums',
+            action='store_true',
+            help='Compute the MD5 checksum of new or resized files',
+            )
+
+    def handle(self, *args, **options):
+        found = scan_artifacts(options['base'])
+        # checksums of files whose name and size are unchanged are kept
+        known = {
+            (file_name, size): md5
+            for file_name, size, md5 in Artifact.objects.exclude(
+                md5='').values_list('file_name', 'size', 'md5')
+        }
+        artifacts = []
+        for (run, file_type), file_name in found.items():
+            path = os.path.join(
+                options['base'], ARTIFACT_DIRS[file_type], run[:6], file_name)
+            size = os.path.getsize(path)
+            md5 = known.get((file_name, size), '')
+            if not md5 and options['checksums']:
+                md5 = file_md5(path)
+            artifacts.append(Artifact(
+                Run=run, file_type=file_type, file_name=file_name,
+                size=size, md5=md5))
+
+        with transaction.atomic():
+            Artifact.objects.all().delete()
+            Artifact.objects.bulk_create(artifacts, batch_size=1000)
+            transaction.on_commit(bump_data_version)
+        self.stdout.write(f"Recorded {len(found)} artifacts")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from main.exports import columnar_available
+from main.page_cache import version_tag
+from main.pivot import SNAPSHOT_FORMATS, pivot_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the pivot dataset snapshots of the current data version, so '
+        'that the first visitor after a data import does not wait for them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild snapshots already built for this version',
+            )
+
+    def handle(self, *args, **options):
+        for file_format in SNAPSHOT_FORMATS:
+            if file_format == 'arrow' and not columnar_available():
+                self.stdout.write("Skipping arrow: pyarrow is not installed")
+                continue
+            snapshot = pivot_snapshot(file_format, rebuild=options['force'])
+            self.stdout.write(
+                f"Pivot {file_format} snapshot of version {version_tag()}: "
+                f"{len(snapshot)} bytes")
@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from main.models import (GWIPS, Artifact, RiboCrypt, Sample, Study, Trips,
+                         ViewerLink)
+
+RUNS = ['SRR0000001', 'SRR0000002']
+BIOPROJECTS = ['PRJNA000001', 'PRJNA000002']
+
+
+def hot_queries() -> dict:
+    '''
+    Return the portal's hot lookups, keyed by a description.
+    '''
+    return {
+        'sample by run': Sample.objects.filter(Run=RUNS[0]),
+        'samples by runs': Sample.objects.filter(Run__in=RUNS),
+        'samples by bioproject': Sample.objects.filter(
+            BioProject__in=BIOPROJECTS),
+        'samples by organism': Sample.objects.filter(
+            ScientificName='homo_sapiens'),
+        'samples by cell line': Sample.objects.filter(CELL_LINE='HeLa'),
+        'samples by tissue': Sample.objects.filter(TISSUE='liver'),
+        'samples by inhibitor': Sample.objects.filter(
+            INHIBITOR__in=['CHX', 'LTM']),
+        'studies by organism': Study.objects.filter(
+            ScientificName='homo_sapiens'),
+        'trips by run or bioproject': Trips.objects.filter(
+            Q(Run__in=RUNS) | Q(BioProject__in=BIOPROJECTS)),
+        'gwips by bioproject': GWIPS.objects.filter(
+            BioProject__in=BIOPROJECTS),
+        'ribocrypt by run or bioproject': RiboCrypt.objects.filter(
+            Q(Run__in=RUNS) | Q(BioProject__in=BIOPROJECTS)),
+        'artifacts by run': Artifact.objects.filter(Run__in=RUNS),
+        'viewer links by run or bioproject': ViewerLink.objects.filter(
+            Q(Run__in=RUNS) | Q(Run='', BioProject__in=BIOPROJECTS)),
+    }
+
+
+def query_plan(queryset) -> list:
+    '''
+    Return the EXPLAIN QUERY PLAN steps of a queryset.
+
+    Arguments:
+    - queryset (QuerySet): the query to explain
+
+    Returns:
+    - (list): the detail of each step of the plan
+    '''
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def is_full_scan(step: str) -> bool:
+    '''
+    Check whether a plan step reads a whole table (SCAN without an index).
+    '''
+    return step.startswith('SCAN ') and ' USING ' not in step
+
+
+class Command(BaseCommand):
+    help = (
+        'Explain the query plans of the hot lookups and fail if any of them '
+        'scans a whole table'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query plans can only be checked on SQLite')
+
+        failures = []
+        for name, queryset in hot_queries().items():
+            plan = query_plan(queryset)
+            scans = [step for step in plan if is_full_scan(step)]
+            status = 'FULL SCAN' if scans else 'ok'
+            self.stdout.write(f"{name}: {status}")
+            for step in plan:
+                self.stdout.write(f"    {step}")
+            if scans:
+                failures.append(name)
+
+        if failures:
+            raise CommandError(
+                f"Full table scans in: {', '.join(failures)}")
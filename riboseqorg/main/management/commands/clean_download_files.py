@@ -0,0 +1,54 @@
+import os
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from main.downloads import DOWNLOAD_FILES_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete stale download scripts from the download directory and '
+        'expired entries (eg. download manifests) from the shared cache. '
+        'Manifests are now streamed, so no new scripts are written there.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=DOWNLOAD_FILES_DIR,
+            help='Directory of the download scripts',
+            )
+        parser.add_argument(
+            '--days',
+            type=float,
+            default=7,
+            help='Delete scripts last modified more than this many days ago',
+            )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the scripts that would be deleted',
+            )
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options['days'] * 24 * 60 * 60
+        removed = 0
+        if os.path.isdir(options['dir']):
+            for entry in os.scandir(options['dir']):
+                if not (entry.is_file()
+                        and entry.name.startswith('RiboSeqOrg_Download_')
+                        and entry.stat().st_mtime < cutoff):
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(entry.path)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(f"{verb} {removed} download scripts")
+
+        if hasattr(cache, 'delete_expired') and not options['dry_run']:
+            self.stdout.write(
+                f"Deleted {cache.delete_expired()} expired cache entries")
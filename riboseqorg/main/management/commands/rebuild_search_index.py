@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Sample, Study
+from main.search import create_fts_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Recreate the full-text search tables of Study and Sample. '
+        'Run after adding or removing text fields on either model.'
+    )
+
+    def handle(self, *args, **options):
+        for model in [Study, Sample]:
+            create_fts_index(model)
+            self.stdout.write(f"Rebuilt search index for {model.__name__}")
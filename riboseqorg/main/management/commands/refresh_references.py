@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.references import REFERENCES_DIR, refresh_reference_catalogue
+
+
+class Command(BaseCommand):
+    help = (
+        'Rescan the reference files for the references page if their '
+        'directories have changed. With --watch, keep polling the directory '
+        'modification times and rescan whenever they change.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=REFERENCES_DIR,
+            help='Root of the reference files',
+            )
+        parser.add_argument(
+            '--checksums',
+            action='store_true',
+            help='Compute the MD5 checksum of new or changed files',
+            )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rescan even if the directories are unchanged',
+            )
+        parser.add_argument(
+            '--watch',
+            type=float,
+            metavar='SECONDS',
+            help='Check the directories for changes every SECONDS',
+            )
+
+    def refresh(self, options, force: bool) -> None:
+        catalogue, rebuilt = refresh_reference_catalogue(
+            options['dir'], options['checksums'], force)
+        if rebuilt:
+            self.stdout.write(
+                f"Catalogued {len(catalogue['references'])} references")
+        elif not options['watch']:
+            self.stdout.write("References are unchanged")
+
+    def handle(self, *args, **options):
+        self.refresh(options, options['force'])
+        if not options['watch']:
+            return
+        try:
+            while True:
+                time.sleep(options['watch'])
+                self.refresh(options, False)
+        except KeyboardInterrupt:
+            pass
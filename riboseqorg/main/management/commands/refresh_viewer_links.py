@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Study, ViewerLink
+from main.viewer_links import refresh_viewer_links
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the materialised GWIPS-viz, Trips-Viz and RiboCrypt links. '
+        'Links are refreshed automatically when data is loaded; use this '
+        'after editing the viewer tables outside Django.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bioproject',
+            action='append',
+            help='Only refresh this BioProject (may be repeated)',
+            )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Only refresh BioProjects that have no links yet',
+            )
+
+    def handle(self, *args, **options):
+        bioprojects = options['bioproject']
+        if options['missing']:
+            linked = ViewerLink.objects.filter(Run='').values('BioProject')
+            bioprojects = list(
+                Study.objects.exclude(BioProject__in=linked)
+                .values_list('BioProject', flat=True)
+                )
+            if not bioprojects:
+                self.stdout.write("All BioProjects already have links")
+                return
+        count = refresh_viewer_links(bioprojects)
+        self.stdout.write(f"Wrote {count} viewer links")
@@ -0,0 +1,115 @@
+from itertools import count, islice
+from typing import Iterable, Iterator, List
+
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# Lists longer than this are not inlined as query parameters
+BULK_THRESHOLD = 500
+
+# Rows inserted into the value table per statement
+CHUNK_SIZE = 500
+
+VALUE_TABLE = 'temp.bulk_values'
+
+_set_ids = count(1)
+
+
+def chunked(values: Iterable, size: int = CHUNK_SIZE) -> Iterator[list]:
+    '''
+    Yield successive lists of at most size values.
+    '''
+    values = iter(values)
+    while True:
+        chunk = list(islice(values, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def in_values(field: str, values: Iterable) -> Q:
+    '''
+    Return a predicate matching rows whose field is one of the values.
+
+    Short lists become a plain IN list. On SQLite, longer ones (eg. the
+    thousands of runs of a links or download request) are loaded into a
+    temporary table of the connection and matched with a subquery, so the
+    SQL stays small and within the parameter and expression limits.
+
+    Arguments:
+    - field (str): the field or lookup path (eg. 'Run', 'BioProject')
+    - values (iterable): the accepted values
+
+    Returns:
+    - (Q): the predicate
+    '''
+    values = sorted({str(value) for value in values})
+    if len(values) <= BULK_THRESHOLD or connection.vendor != 'sqlite':
+        return Q(**{f'{field}__in': values})
+    return Q(**{f'{field}__in': ValueSet(_load_values(values))})
+
+
+class ValueSet(RawSQL):
+    '''
+    Subquery selecting the values of a set loaded by in_values. The set
+    lives until the end of the request (see release_values); a query
+    compiled after that raises an error rather than matching nothing.
+    '''
+
+    def __init__(self, set_id: int):
+        super().__init__(
+            f'SELECT value FROM {VALUE_TABLE} WHERE set_id = %s', [set_id])
+        self.set_id = set_id
+
+    def as_sql(self, compiler, connection):
+        if self.set_id not in getattr(connection, 'bulk_value_sets', []):
+            raise RuntimeError(
+                f'Value set {self.set_id} was released at the end of the '
+                'request that loaded it; evaluate the queryset before then')
+        return super().as_sql(compiler, connection)
+
+
+def _load_values(values: List[str]) -> int:
+    set_id = next(_set_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {VALUE_TABLE} ('
+            'set_id INTEGER NOT NULL, value TEXT NOT NULL, '
+            'PRIMARY KEY (set_id, value)) WITHOUT ROWID'
+        )
+        for chunk in chunked(values):
+            cursor.executemany(
+                f'INSERT OR IGNORE INTO {VALUE_TABLE} (set_id, value) '
+                'VALUES (%s, %s)',
+                [(set_id, value) for value in chunk],
+            )
+    if not hasattr(connection, 'bulk_value_sets'):
+        connection.bulk_value_sets = []
+    connection.bulk_value_sets.append(set_id)
+    return set_id
+
+
+def release_values(**kwargs) -> None:
+    '''
+    Signal handler emptying the value sets loaded during a request. The
+    table itself goes away with the connection.
+    '''
+    set_ids = getattr(connection, 'bulk_value_sets', None)
+    if not set_ids:
+        return
+    connection.bulk_value_sets = []
+    if connection.connection is None:
+        return
+    try:
+        with connection.cursor() as cursor:
+            for chunk in chunked(set_ids):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(
+                    f'DELETE FROM {VALUE_TABLE} '
+                    f'WHERE set_id IN ({placeholders})',
+                    chunk,
+                )
+    except DatabaseError:
+        # the connection was reopened, taking the table with it
+        pass
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.5 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Artifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Run', models.CharField(max_length=200)),
+                ('file_type', models.CharField(max_length=50)),
+                ('file_name', models.CharField(max_length=300)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='artifact',
+            constraint=models.UniqueConstraint(fields=('Run', 'file_type'), name='unique_artifact_per_run'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+from django.db import migrations
+
+# The search tables as they were when this migration was written, so that
+# later changes to main.search do not alter it. rebuild_search_index
+# recreates them from the current models.
+
+STUDY_COLUMNS = [
+    'BioProject', 'Name', 'Title', 'ScientificName', 'SRA', 'GSE',
+    'PMID', 'Authors', 'Publication_title', 'Journal', 'Samples',
+    'Release_Date', 'Description', 'seq_types', 'Study_abstract', 'doi',
+    'Date_published', 'PMC', 'Paper_abstract', 'Email',
+]
+
+SAMPLE_COLUMNS = [
+    'id', 'Run', 'GEO', 'Experiment', 'BioSample', 'ScientificName',
+    'TISSUE', 'CELL_LINE', 'INHIBITOR', 'LIBRARYTYPE', 'CONDITION',
+    'GENE', 'SampleName', 'sample_title', 'process_status',
+    'LibraryName', 'LibraryStrategy', 'LibrarySelection',
+    'LibrarySource', 'LibraryLayout', 'InsertSize', 'InsertDev',
+    'Platform', 'Model', 'SRAStudy', 'Study_Pubmed_id', 'Sample',
+    'SampleType', 'TaxID', 'CenterName', 'Submission', 'MONTH', 'YEAR',
+    'AUTHOR', 'sample_source', 'REPLICATE', 'BATCH', 'TIMEPOINT',
+    'FRACTION', 'ENA_first_public', 'ENA_last_update',
+    'INSDC_center_alias', 'INSDC_center_name', 'INSDC_first_public',
+    'INSDC_last_update', 'INSDC_status', 'ENA_checklist',
+    'GEO_Accession', 'Experiment_Date', 'date_sequenced',
+    'submission_date', 'date', 'STAGE', 'Sex', 'Strain', 'Age',
+    'Infected', 'Disease', 'Genotype', 'Feeding', 'Temperature',
+    'SiRNA', 'SgRNA', 'ShRNA', 'Plasmid', 'Growth_Condition', 'Stress',
+    'Cancer', 'microRNA', 'Individual', 'Antibody', 'Ethnicity', 'Dose',
+    'Stimulation', 'Host', 'UMI', 'Adapter', 'Separation',
+    'rRNA_depletion', 'Barcode', 'Monosome_purification', 'Nuclease',
+    'Kit', 'Info',
+]
+
+INDEXES = [
+    # table, FTS table, columns, key, unindexed columns
+    ('main_study', 'main_study_fts', STUDY_COLUMNS, 'BioProject', []),
+    ('main_sample', 'main_sample_fts', SAMPLE_COLUMNS, 'id', ['id']),
+]
+
+
+def index_statements(table, fts, columns, key, unindexed):
+    definitions = ', '.join(
+        f'"{column}"' + (' UNINDEXED' if column in unindexed else '')
+        for column in columns
+    )
+    names = ', '.join(f'"{column}"' for column in columns)
+    new_values = ', '.join(f'new."{column}"' for column in columns)
+    old_values = ', '.join(f'old."{column}"' for column in columns)
+    if key == 'id':
+        # external content, keyed by the integer primary key
+        return [
+            f'CREATE VIRTUAL TABLE "{fts}" USING fts5({definitions}, '
+            f"content='{table}', content_rowid='id', prefix='2 3')",
+            f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"(rowid, {names}) '
+            f'VALUES (new."id", {new_values}); END',
+            f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"("{fts}", rowid, {names}) '
+            f"VALUES ('delete', old.\"id\", {old_values}); END",
+            f'CREATE TRIGGER "{fts}_au" AFTER UPDATE ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"("{fts}", rowid, {names}) '
+            f"VALUES ('delete', old.\"id\", {old_values}); "
+            f'INSERT INTO "{fts}"(rowid, {names}) '
+            f'VALUES (new."id", {new_values}); END',
+            f'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')',
+        ]
+    # the FTS table stores its own copy, kept in sync by the text key
+    return [
+        f'CREATE VIRTUAL TABLE "{fts}" USING fts5({definitions}, '
+        f"prefix='2 3')",
+        f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}"({names}) VALUES ({new_values}); END',
+        f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+        f'DELETE FROM "{fts}" WHERE "{key}" = old."{key}"; END',
+        f'CREATE TRIGGER "{fts}_au" AFTER UPDATE ON "{table}" BEGIN '
+        f'DELETE FROM "{fts}" WHERE "{key}" = old."{key}"; '
+        f'INSERT INTO "{fts}"({names}) VALUES ({new_values}); END',
+        f'INSERT INTO "{fts}"({names}) SELECT {names} FROM "{table}"',
+    ]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    drop_search_indexes(apps, schema_editor)
+    for index in INDEXES:
+        for statement in index_statements(*index):
+            schema_editor.execute(statement, params=None)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for _, fts, _, _, _ in INDEXES:
+        for suffix in ['ai', 'ad', 'au']:
+            schema_editor.execute(
+                f'DROP TRIGGER IF EXISTS "{fts}_{suffix}"', params=None)
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{fts}"', params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_dataversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.5 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewerLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('BioProject', models.CharField(max_length=200)),
+                ('Run', models.CharField(blank=True, max_length=200)),
+                ('trips_link', models.TextField()),
+                ('trips_name', models.CharField(blank=True, max_length=50)),
+                ('gwips_link', models.TextField()),
+                ('gwips_name', models.CharField(blank=True, max_length=50)),
+                ('gwips_run_link', models.TextField()),
+                ('gwips_run_name', models.CharField(blank=True, max_length=50)),
+                ('ribocrypt_link', models.TextField()),
+                ('ribocrypt_name', models.CharField(blank=True, max_length=50)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='viewerlink',
+            index=models.Index(fields=['Run'], name='viewer_link_run'),
+        ),
+        migrations.AddConstraint(
+            model_name='viewerlink',
+            constraint=models.UniqueConstraint(fields=('BioProject', 'Run'), name='unique_viewer_link'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.1.5 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_viewerlink'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gwips',
+            index=models.Index(fields=['BioProject'], name='gwips_bioproject'),
+        ),
+        migrations.AddIndex(
+            model_name='ribocrypt',
+            index=models.Index(fields=['Run'], name='ribocrypt_run'),
+        ),
+        migrations.AddIndex(
+            model_name='ribocrypt',
+            index=models.Index(fields=['BioProject'], name='ribocrypt_bioproject'),
+        ),
+        migrations.AddIndex(
+            model_name='sample',
+            index=models.Index(fields=['Run'], name='sample_run'),
+        ),
+        migrations.AddIndex(
+            model_name='sample',
+            index=models.Index(fields=['ScientificName'], name='sample_scientific_name'),
+        ),
+        migrations.AddIndex(
+            model_name='sample',
+            index=models.Index(fields=['CELL_LINE'], name='sample_cell_line'),
+        ),
+        migrations.AddIndex(
+            model_name='sample',
+            index=models.Index(fields=['TISSUE'], name='sample_tissue'),
+        ),
+        migrations.AddIndex(
+            model_name='sample',
+            index=models.Index(fields=['INHIBITOR', 'LIBRARYTYPE'], name='sample_inhibitor_librarytype'),
+        ),
+        migrations.AddIndex(
+            model_name='study',
+            index=models.Index(fields=['ScientificName'], name='study_scientific_name'),
+        ),
+        migrations.AddIndex(
+            model_name='trips',
+            index=models.Index(fields=['Run'], name='trips_run'),
+        ),
+        migrations.AddIndex(
+            model_name='trips',
+            index=models.Index(fields=['BioProject'], name='trips_bioproject'),
+        ),
+        migrations.AddConstraint(
+            model_name='sample',
+            constraint=models.UniqueConstraint(condition=models.Q(('Run', ''), _negated=True), fields=('Run',), name='unique_sample_run'),
+        ),
+    ]
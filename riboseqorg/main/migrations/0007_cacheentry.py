@@ -0,0 +1,24 @@
+# Generated by Django 4.1.5 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('value', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('expires', models.FloatField(null=True)),
+                ('accessed', models.FloatField(db_index=True)),
+            ],
+        ),
+    ]
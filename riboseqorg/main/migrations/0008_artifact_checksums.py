@@ -0,0 +1,23 @@
+# Generated by Django 4.1.5 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_cacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artifact',
+            name='md5',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='artifact',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,14 +1,47 @@
 
 from django.db import models
+from django.utils.functional import cached_property
+
+from .membership import BULK_THRESHOLD, chunked
 
 import os
 
 
+SERVER_BASE = "/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg"
+
+ARTIFACT_SUFFIXES = {
+    "reads": ".collapsed.fa.gz",
+    "counts": "_counts.txt",
+    "bams": ".bam",
+    "adapter_report": ".adapter.fa",
+    "fastp": ".html",
+    "fastqc": "_fastqc.html",
+    "ribometric": "bamtrans_RiboMetric.html",
+    "bigwig (forward)": "_pshifted_forward.bigWig",
+    "bigwig (reverse)": "_pshifted_reverse.bigWig",
+}
+
+ARTIFACT_DIRS = {
+    "reads": "collapsed_reads",
+    "counts": "counts",
+    "bams": "bams",
+    "adapter_report": "adapter_reports",
+    "fastp": "fastp",
+    "fastqc": "fastqc",
+    "ribometric": "ribometric",
+    "bigwig (forward)": "bigwig",
+    "bigwig (reverse)": "bigwig",
+}
+
+
 def generate_link(project, run, type="reads"):
     """
     Generate Link for a specific run of a given type (default is reads)
     Ensure path is valid before returning link
 
+    This checks the file system directly. Pages should use the Sample
+    link properties, which read from the Artifact manifest instead.
+
     Arguments:
     - project (str): the project accession number
     - run (str): the run accession number
@@ -19,43 +52,70 @@ def generate_link(project, run, type="reads"):
     OR
     - (None): if the link is not valid
     """
-    server_base = "/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg"
-    path_suffixes = {
-        "reads": ".collapsed.fa.gz",
-        "counts": "_counts.txt",
-        "bams": ".bam",
-        "adapter_report": ".adapter.fa",
-        "fastp": ".html",
-        "fastqc": "_fastqc.html",
-        "ribometric": "bamtrans_RiboMetric.html",
-        "bigwig (forward)": "_pshifted_forward.bigWig",
-        "bigwig (reverse)": "_pshifted_reverse.bigWig",
-    }
-    path_dirs = {
-        "reads": "collapsed_reads",
-        "counts": "counts",
-        "bams": "bams",
-        "adapter_report": "adapter_reports",
-        "fastp": "fastp",
-        "fastqc": "fastqc",
-        "ribometric": "ribometric",
-        "bigwig (forward)": "bigwig",
-        "bigwig (reverse)": "bigwig",
-    }
     project = str(project)
     run = str(run)
-    if os.path.exists(
-            os.path.join(server_base, path_dirs[type], run[:6],
-                         run + path_suffixes[type])):
-        return f"https://rdp.ucc.ie/static2/{path_dirs[type]}/{run[:6]}/{run + path_suffixes[type]}"
-
-    elif os.path.exists(
-            os.path.join(server_base, path_dirs[type], run[:6],
-                         run + "_1" + path_suffixes[type])):
-        return f"https://rdp.ucc.ie/static2/{path_dirs[type]}/{run[:6]}/{run}_1{path_suffixes[type]}"
+    for file_name in (run + ARTIFACT_SUFFIXES[type],
+                      run + "_1" + ARTIFACT_SUFFIXES[type]):
+        if os.path.exists(
+                os.path.join(SERVER_BASE, ARTIFACT_DIRS[type], run[:6],
+                             file_name)):
+            return artifact_url(run, type, file_name)
     return ""
 
 
+def artifact_url(run, type, file_name):
+    """
+    Return the public URL of an artifact file
+
+    Arguments:
+    - run (str): the run accession number
+    - type (str): the artifact type (key of ARTIFACT_DIRS)
+    - file_name (str): the name of the file within the run directory
+
+    Returns:
+    - (str): the link to the file
+    """
+    return f"https://rdp.ucc.ie/static2/{ARTIFACT_DIRS[type]}/{run[:6]}/{file_name}"
+
+
+def get_artifact_links(runs) -> dict:
+    """
+    Look up the artifact links of many runs, with one query per
+    membership.BULK_THRESHOLD runs so that the IN lists stay within the
+    SQLite variable limit
+
+    Arguments:
+    - runs (iterable): the run accession numbers
+
+    Returns:
+    - (dict): the links of each run, keyed by file type
+    """
+    links = {run: {} for run in runs}
+    for chunk in chunked(links, BULK_THRESHOLD):
+        artifacts = Artifact.objects.filter(Run__in=chunk).values_list(
+            'Run', 'file_type', 'file_name')
+        for run, file_type, file_name in artifacts:
+            links[run][file_type] = artifact_url(run, file_type, file_name)
+    return links
+
+
+def prefetch_artifact_links(samples):
+    """
+    Attach the artifact links of many samples using a single query
+
+    Arguments:
+    - samples (iterable): Sample instances (eg. a page of results)
+
+    Returns:
+    - (iterable): the same samples, with their link properties populated
+    """
+    samples = list(samples)
+    links = get_artifact_links(sample.Run for sample in samples)
+    for sample in samples:
+        sample.__dict__['artifact_links'] = links[sample.Run]
+    return samples
+
+
 def check_trips(project, run):
     """
     Check if a given run is present in the TRIPS database
@@ -147,6 +207,12 @@ class Study(models.Model):
     Paper_abstract = models.CharField(max_length=1500, blank=True)
     Email = models.CharField(max_length=200, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['ScientificName'], name='study_scientific_name'),
+        ]
+
     def __str__(self):
         return self.BioProject
 
@@ -259,44 +325,77 @@ class Sample(models.Model):
     Kit = models.CharField(max_length=200, blank=True)
     Info = models.TextField(blank=True)
 
+    class Meta:
+        constraints = [
+            # Runs without an accession are left out of the unique index,
+            # which SQLite then cannot use for plain lookups by Run
+            models.UniqueConstraint(
+                fields=['Run'],
+                condition=~models.Q(Run=''),
+                name='unique_sample_run',
+                ),
+        ]
+        indexes = [
+            models.Index(fields=['Run'], name='sample_run'),
+            models.Index(
+                fields=['ScientificName'], name='sample_scientific_name'),
+            models.Index(fields=['CELL_LINE'], name='sample_cell_line'),
+            models.Index(fields=['TISSUE'], name='sample_tissue'),
+            models.Index(
+                fields=['INHIBITOR', 'LIBRARYTYPE'],
+                name='sample_inhibitor_librarytype'),
+        ]
+
     def __str__(self):
         return self.Run
 
+    @cached_property
+    def artifact_links(self):
+        """
+        Links to the processed files of this run, keyed by artifact type.
+        Read from the Artifact manifest rather than the file system.
+        """
+        return {
+            file_type: artifact_url(self.Run, file_type, file_name)
+            for file_type, file_name in Artifact.objects.filter(
+                Run=self.Run).values_list('file_type', 'file_name')
+        }
+
     @property
     def fastqc_link(self):
-        return generate_link(self.BioProject, self.Run, "fastqc")
+        return self.artifact_links.get("fastqc", "")
 
     @property
     def fastp_link(self):
-        return generate_link(self.BioProject, self.Run, "fastp")
+        return self.artifact_links.get("fastp", "")
 
     @property
     def adapter_report_link(self):
-        return generate_link(self.BioProject, self.Run, "adapter_report")
+        return self.artifact_links.get("adapter_report", "")
 
     @property
     def ribometric_link(self):
-        return generate_link(self.BioProject, self.Run, "ribometric")
+        return self.artifact_links.get("ribometric", "")
 
     @property
     def reads_link(self):
-        return generate_link(self.BioProject, self.Run, "reads")
+        return self.artifact_links.get("reads", "")
 
     @property
     def counts_link(self):
-        return generate_link(self.BioProject, self.Run, "counts")
+        return self.artifact_links.get("counts", "")
 
     @property
     def bam_link(self):
-        return generate_link(self.BioProject, self.Run, "bams")
+        return self.artifact_links.get("bams", "")
 
     @property
     def bigwig_forward_link(self):
-        return generate_link(self.BioProject, self.Run, "bigwig (forward)")
+        return self.artifact_links.get("bigwig (forward)", "")
 
     @property
     def bigwig_reverse_link(self):
-        return generate_link(self.BioProject, self.Run, "bigwig (reverse)")
+        return self.artifact_links.get("bigwig (reverse)", "")
 
 
 class OpenColumns(models.Model):
@@ -320,6 +419,12 @@ class Trips(models.Model):
     organism = models.CharField(max_length=100)
     transcriptome = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['Run'], name='trips_run'),
+            models.Index(fields=['BioProject'], name='trips_bioproject'),
+        ]
+
     def __str__(self):
         return f"Trips {self.pk}: {self.file_name}"
 
@@ -331,6 +436,11 @@ class GWIPS(models.Model):
     GWIPS_Elong_Suffix = models.CharField(max_length=100)
     GWIPS_Init_Suffix = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['BioProject'], name='gwips_bioproject'),
+        ]
+
     def __str__(self):
         return f"GWIPS {self.pk}: {self.gwips_db}"
 
@@ -341,5 +451,100 @@ class RiboCrypt(models.Model):
     ribocrypt_id = models.CharField(max_length=100)
     Run = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['Run'], name='ribocrypt_run'),
+            models.Index(
+                fields=['BioProject'], name='ribocrypt_bioproject'),
+        ]
+
     def __str__(self):
         return f"RiboCrypt {self.pk}: {self.ribocrypt_id}"
+
+
+class Artifact(models.Model):
+    """
+    Manifest of the processed files available for each run. Built by the
+    build_artifact_manifest management command so that pages do not need
+    to stat the data volume. The size and MD5 checksum of a file are
+    recorded when known, for checksummed download manifests.
+    """
+    Run = models.CharField(max_length=200)
+    file_type = models.CharField(max_length=50)
+    file_name = models.CharField(max_length=300)
+    size = models.BigIntegerField(blank=True, null=True)
+    md5 = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['Run', 'file_type'],
+                name='unique_artifact_per_run',
+                ),
+        ]
+
+    def __str__(self):
+        return f"{self.Run} {self.file_type}: {self.file_name}"
+
+
+class DataVersion(models.Model):
+    """
+    Single row counter bumped whenever the portal data is changed (eg. by
+    loading fixtures). In-process indexes and caches compare against it to
+    know when to rebuild.
+    """
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Data version {self.version}"
+
+
+class ViewerLink(models.Model):
+    """
+    Denormalised GWIPS-viz, Trips-Viz and RiboCrypt links of each run and
+    of each BioProject (on which Run is blank). Refreshed whenever the
+    viewer tables or samples are loaded, see viewer_links.py.
+
+    gwips_run_link holds the GWIPS-viz link chosen from the sample
+    inhibitor, used when runs are selected directly.
+    """
+    BioProject = models.CharField(max_length=200)
+    Run = models.CharField(max_length=200, blank=True)
+    trips_link = models.TextField()
+    trips_name = models.CharField(max_length=50, blank=True)
+    gwips_link = models.TextField()
+    gwips_name = models.CharField(max_length=50, blank=True)
+    gwips_run_link = models.TextField()
+    gwips_run_name = models.CharField(max_length=50, blank=True)
+    ribocrypt_link = models.TextField()
+    ribocrypt_name = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['BioProject', 'Run'],
+                name='unique_viewer_link',
+                ),
+        ]
+        indexes = [
+            models.Index(fields=['Run'], name='viewer_link_run'),
+        ]
+
+    def __str__(self):
+        return f"Viewer links {self.BioProject} {self.Run}"
+
+
+class CacheEntry(models.Model):
+    """
+    Entry of the shared cache (see cache_backend.py). Values are pickled
+    and compressed; accessed records when the entry was last read, for
+    least recently used eviction.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    value = models.BinaryField()
+    size = models.PositiveIntegerField()
+    expires = models.FloatField(null=True)
+    accessed = models.FloatField(db_index=True)
+
+    def __str__(self):
+        return self.key
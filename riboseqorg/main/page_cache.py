@@ -0,0 +1,162 @@
+import hashlib
+import json
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Model
+
+from .data_version import get_data_version
+
+# Fragments are keyed by data version, so the timeout only bounds how long
+# entries for superseded versions linger
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+# Streamed content longer than this (in characters) is passed straight
+# through rather than held in memory to be cached
+STREAM_CACHE_LIMIT = 4 * 1024 * 1024
+
+# Fragment cache hits and misses of this process, keyed by view
+fragment_stats: Dict[str, Counter] = defaultdict(Counter)
+
+
+def canonical_selection(selection: Dict[str, list]) -> str:
+    '''
+    Serialise a filter selection independently of the order of its fields,
+    of the order of their options and of repeated options.
+
+    Arguments:
+    - selection (dict): the selected options keyed by original field name
+
+    Returns:
+    - (str): the canonical form of the selection
+    '''
+    return json.dumps(
+        sorted(
+            (field, sorted({str(option) for option in options}))
+            for field, options in selection.items()
+        ),
+        separators=(',', ':'),
+    )
+
+
+def version_tag() -> str:
+    '''
+    Return the current data version as a string (eg. '12.0'), for keys and
+    validators of content derived from the portal data.
+    '''
+    return '.'.join(str(part) for part in get_data_version())
+
+
+def fragment_key(view: str, fragment: str, selection: Dict[str, list]) -> str:
+    '''
+    Return the cache key of a page fragment for a selection at the current
+    data version.
+
+    Arguments:
+    - view (str): the page (eg. 'samples')
+    - fragment (str): the part of the page (eg. 'facets')
+    - selection (dict): the selected options keyed by original field name
+
+    Returns:
+    - (str): the cache key
+    '''
+    digest = hashlib.sha1(
+        canonical_selection(selection).encode('utf8')).hexdigest()
+    return f"{view}:{fragment}:{version_tag()}:{digest}"
+
+
+def cached_fragment(
+        view: str,
+        fragment: str,
+        selection: Dict[str, list],
+        compute: Callable):
+    '''
+    Return a cached page fragment, computing and caching it if needed.
+    '''
+    key = fragment_key(view, fragment, selection)
+    value = cache.get(key)
+    if value is None:
+        fragment_stats[view]['misses'] += 1
+        value = compute()
+        cache.set(key, value, FRAGMENT_TIMEOUT)
+    else:
+        fragment_stats[view]['hits'] += 1
+    return value
+
+
+def cached_stream(
+        view: str,
+        fragment: str,
+        selection: Dict[str, list],
+        chunks: Iterable[str],
+        limit: int = STREAM_CACHE_LIMIT) -> Iterator[str]:
+    '''
+    Yield the chunks of a streamed response, caching the whole content once
+    it has been sent so that repeat requests are served from the cache.
+    Content longer than limit is streamed without being kept or cached.
+
+    Arguments:
+    - view (str): the page (eg. 'downloads')
+    - fragment (str): the kind of content (eg. the manifest format)
+    - selection (dict): the selected options keyed by name
+    - chunks (iterable): the content, generated on a cache miss only
+    - limit (int): the length of the longest content cached
+
+    Returns:
+    - (iterator): the chunks of the content
+    '''
+    key = fragment_key(view, fragment, selection)
+    content = cache.get(key)
+    if content is not None:
+        fragment_stats[view]['hits'] += 1
+        yield content
+        return
+    fragment_stats[view]['misses'] += 1
+    sent: Optional[list] = []
+    size = 0
+    for chunk in chunks:
+        if sent is not None:
+            size += len(chunk)
+            if size > limit:
+                sent = None
+            else:
+                sent.append(chunk)
+        yield chunk
+    if sent is not None:
+        cache.set(key, ''.join(sent), FRAGMENT_TIMEOUT)
+
+
+class CountedPaginator(Paginator):
+    '''
+    Paginator told the number of rows in advance, so that paging a queryset
+    runs no COUNT query.
+    '''
+
+    def __init__(self, object_list, per_page, count: int, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
+
+def paginate_ids(model: Model, ids: list, page_number, per_page: int = 10
+                 ) -> Page:
+    '''
+    Paginate an ordered list of primary keys, loading the instances of the
+    requested page only.
+
+    Arguments:
+    - model (Model): the model of the keys
+    - ids (list): the ordered primary keys
+    - page_number: the requested page, as given in the request
+    - per_page (int): the number of rows on a page
+
+    Returns:
+    - (Page): the page, holding model instances
+    '''
+    page_obj = Paginator(ids, per_page).get_page(page_number)
+    objects = model.objects.in_bulk(list(page_obj.object_list))
+    page_obj.object_list = [
+        objects[key] for key in page_obj.object_list if key in objects
+    ]
+    return page_obj
@@ -0,0 +1,43 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class SampleCursorPagination(CursorPagination):
+    '''
+    Keyset pagination of the samples API in primary key order, or in the
+    order requested with the ordering parameter, ties being broken by the
+    primary key so that no sample is skipped or repeated between pages.
+
+    Pages are only used when the client asks for them with a cursor or a
+    page_size, so that requests using limit keep getting a plain list. The
+    next page is linked from the response body and, for the binary formats,
+    from a Link header.
+    '''
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'SAMPLE_API_MAX_PAGE_SIZE', 10000)
+
+    def is_requested(self, request) -> bool:
+        return any(
+            param in request.query_params
+            for param in [self.cursor_query_param, self.page_size_query_param]
+        )
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[-1].lstrip('-') in ('id', 'pk'):
+            return ordering
+        return (*ordering, 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        next_link = self.get_next_link()
+        if next_link:
+            response['Link'] = f'<{next_link}>; rel="next"'
+        return response
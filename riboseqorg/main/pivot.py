@@ -0,0 +1,147 @@
+import gzip
+from typing import Dict, List, Tuple
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .exports import json_bytes, rows_to_table, table_to_bytes
+from .field_registry import get_model_fields
+from .filter_compiler import compile_filter
+from .models import Sample
+from .page_cache import FRAGMENT_TIMEOUT, cached_fragment, version_tag
+
+# Sample fields left out of the pivot table: identifiers, dates and flags
+# with (nearly) one value per sample, which make no useful dimension
+PIVOT_EXCLUDED = [
+    'id', 'verified', 'Experiment', 'InsertDev', 'trips_id', 'gwips_id',
+    'ribocrypt_id', 'FASTA_file', 'sample_title', 'MONTH', 'YEAR',
+    'ENA_checklist', 'ENA_first_public', 'ENA_last_update',
+    'INSDC_center_alias', 'INSDC_center_name', 'INSDC_first_public',
+    'INSDC_last_update', 'INSDC_status', 'spots', 'SampleName', 'CenterName',
+    'Submission', 'BioProject', 'Run', 'SRAStudy', 'Study_Pubmed_id',
+    'Sample', 'BioSample', 'TaxID', 'AUTHOR', 'GEO_Accession',
+    'Experiment_Date', 'date_sequenced', 'submission_date', 'date', 'Info',
+]
+
+# The most dimensions a single pivot may group by, bounding its size
+MAX_PIVOT_DIMENSIONS = 4
+
+MISSING_LABEL = 'Missing'
+
+# content type of each snapshot format
+SNAPSHOT_FORMATS = {
+    'json': 'application/json',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+# Seconds browsers and proxies may reuse a snapshot without revalidating:
+# briefly for the unversioned URL, for good when the URL names the version
+SNAPSHOT_MAX_AGE = 5 * 60
+SNAPSHOT_IMMUTABLE_AGE = 365 * 24 * 60 * 60
+
+
+def pivot_dimensions() -> Tuple[str, ...]:
+    '''
+    Return the Sample fields that can be pivoted on.
+    '''
+    fields = get_model_fields(Sample)
+    return tuple(
+        info.name for info in fields
+        if info.concrete and not info.is_relation
+        and info.name not in PIVOT_EXCLUDED
+    )
+
+
+def pivot_counts(
+        rows: List[str],
+        cols: List[str],
+        spec: Dict[str, tuple]) -> dict:
+    '''
+    Count the samples of every combination of values of the row and column
+    dimensions, grouping in SQL. Results are cached by dimensions and
+    filters at the current data version.
+
+    Arguments:
+    - rows (list): the row dimensions, Sample field names
+    - cols (list): the column dimensions, Sample field names
+    - spec (dict): the filter spec of the samples counted
+
+    Returns:
+    - (dict): the dimensions and, under 'data', one [value, ..., count]
+        list per combination, values in the order of rows then cols
+    '''
+    dimensions = list(rows) + list(cols)
+
+    def compute():
+        samples = Sample.objects.filter(compile_filter(spec))
+        if dimensions:
+            groups = samples.values_list(*dimensions).annotate(
+                count=Count('pk')).order_by(*dimensions)
+        else:
+            groups = [(samples.count(),)]
+        data = [
+            [MISSING_LABEL if value is None else value for value in group[:-1]]
+            + [group[-1]]
+            for group in groups if group[-1]
+        ]
+        return {
+            'rows': list(rows),
+            'cols': list(cols),
+            'total': sum(group[-1] for group in data),
+            'data': data,
+        }
+
+    fragment = f"{','.join(rows)}|{','.join(cols)}"
+    return cached_fragment('pivot', fragment, spec, compute)
+
+
+def build_pivot_snapshot(file_format: str = 'json') -> bytes:
+    '''
+    Build the pivot dataset: the value of every pivot dimension for every
+    sample, dictionary encoded and gzip compressed.
+
+    The JSON snapshot holds the dimension names under 'columns', the
+    distinct values of each dimension under 'dictionaries' and, under
+    'rows', the index of the value of each dimension for every sample.
+    The Arrow snapshot is an IPC file with dictionary encoded columns.
+
+    Arguments:
+    - file_format (str): 'json' or 'arrow'
+
+    Returns:
+    - (bytes): the compressed snapshot
+    '''
+    dimensions = list(pivot_dimensions())
+    rows = Sample.objects.order_by('id').values_list(*dimensions).iterator()
+    if file_format == 'arrow':
+        return gzip.compress(
+            table_to_bytes(rows_to_table(dimensions, rows), 'arrow'))
+
+    dictionaries: List[dict] = [{} for _ in dimensions]
+    encoded = [
+        [
+            dictionary.setdefault(
+                MISSING_LABEL if value is None else value, len(dictionary))
+            for dictionary, value in zip(dictionaries, row)
+        ]
+        for row in rows
+    ]
+    return gzip.compress(json_bytes({
+        'version': version_tag(),
+        'columns': dimensions,
+        'dictionaries': [list(dictionary) for dictionary in dictionaries],
+        'rows': encoded,
+    }))
+
+
+def pivot_snapshot(file_format: str = 'json', rebuild: bool = False) -> bytes:
+    '''
+    Return the pivot snapshot of the current data version, building it
+    only once per version (see build_pivot_snapshot) unless rebuild is set.
+    '''
+    key = f"pivot:snapshot:{file_format}:{version_tag()}"
+    snapshot = None if rebuild else cache.get(key)
+    if snapshot is None:
+        snapshot = build_pivot_snapshot(file_format)
+        cache.set(key, snapshot, FRAGMENT_TIMEOUT)
+    return snapshot
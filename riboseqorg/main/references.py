@@ -0,0 +1,128 @@
+import os
+from typing import List, Optional, Tuple
+
+from django.core.cache import cache
+
+from .models import SERVER_BASE
+from .utilities import file_md5
+
+REFERENCES_DIR = f"{SERVER_BASE}/references"
+
+CATALOGUE_KEY = 'references:catalogue'
+
+# reference file kinds and the extension of their files
+REFERENCE_FILES = {
+    'gtf': '.gtf',
+    'fasta': '.fa',
+}
+
+
+def reference_signature(references_dir: str = REFERENCES_DIR) -> List[list]:
+    '''
+    Return the modification times of the references directory and of its
+    organism directories, which change when reference files are added,
+    removed or renamed.
+
+    Arguments:
+    - references_dir (str): the root of the reference files
+
+    Returns:
+    - (list): [name, mtime in ns] pairs, the root being named ''
+    '''
+    if not os.path.isdir(references_dir):
+        return []
+    signature = [['', os.stat(references_dir).st_mtime_ns]]
+    for entry in sorted(os.scandir(references_dir), key=lambda e: e.name):
+        if entry.is_dir():
+            signature.append([entry.name, entry.stat().st_mtime_ns])
+    return signature
+
+
+def scan_references(
+        references_dir: str = REFERENCES_DIR,
+        checksums: bool = False,
+        previous: Optional[dict] = None) -> dict:
+    '''
+    Scan the reference files: the annotation (GTF) and genome (FASTA) of
+    each organism directory, with their sizes and, if requested, their MD5
+    checksums. Organisms missing either file are left out.
+
+    Arguments:
+    - references_dir (str): the root of the reference files
+    - checksums (bool): compute the checksums of new or changed files
+    - previous (dict): an earlier catalogue, whose checksums are kept for
+        files of unchanged size and modification time
+
+    Returns:
+    - (dict): the catalogue, with the directory signature, the references
+        sorted by organism name and the size, mtime and md5 of each file
+    '''
+    known = previous['files'] if previous else {}
+    signature = reference_signature(references_dir)
+    files: dict = {}
+    references = []
+    for organism_dir, _ in signature[1:]:
+        organism_path = os.path.join(references_dir, organism_dir)
+        names = sorted(os.listdir(organism_path))
+        reference = {'name': organism_dir.replace('_', ' ').title()}
+        for kind, extension in REFERENCE_FILES.items():
+            file_name = next((f for f in names if f.endswith(extension)), None)
+            if file_name is None:
+                break
+            path = os.path.join("static2", "references", organism_dir, file_name)
+            stat = os.stat(os.path.join(organism_path, file_name))
+            size, mtime, md5 = stat.st_size, stat.st_mtime_ns, ''
+            if path in known and known[path][:2] == [size, mtime]:
+                md5 = known[path][2]
+            if not md5 and checksums:
+                md5 = file_md5(os.path.join(organism_path, file_name))
+            files[path] = [size, mtime, md5]
+            reference.update({
+                kind: path, f'{kind}_size': size, f'{kind}_md5': md5,
+            })
+        else:
+            references.append(reference)
+
+    return {
+        'signature': signature,
+        'references': sorted(references, key=lambda x: x['name']),
+        'files': files,
+    }
+
+
+def get_reference_catalogue() -> dict:
+    '''
+    Return the cached reference catalogue, scanning the reference files
+    only if it is not cached. Pages do not check the data volume for
+    changes: refresh_reference_catalogue does (see the refresh_references
+    command).
+    '''
+    catalogue = cache.get(CATALOGUE_KEY)
+    if catalogue is None:
+        catalogue = scan_references()
+        cache.set(CATALOGUE_KEY, catalogue, None)
+    return catalogue
+
+
+def refresh_reference_catalogue(
+        references_dir: str = REFERENCES_DIR,
+        checksums: bool = False,
+        force: bool = False) -> Tuple[dict, bool]:
+    '''
+    Rescan the reference files if their directories have changed since the
+    cached catalogue was built (or if checksums are requested and missing,
+    or force is set), and cache the new catalogue.
+
+    Returns:
+    - (tuple): the catalogue and whether it was rebuilt
+    '''
+    previous = cache.get(CATALOGUE_KEY)
+    if previous is not None and not force:
+        unchanged = previous['signature'] == reference_signature(references_dir)
+        complete = not checksums or all(
+            md5 for _, _, md5 in previous['files'].values())
+        if unchanged and complete:
+            return previous, False
+    catalogue = scan_references(references_dir, checksums, previous)
+    cache.set(CATALOGUE_KEY, catalogue, None)
+    return catalogue, True
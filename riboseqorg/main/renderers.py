@@ -0,0 +1,59 @@
+from rest_framework.renderers import BaseRenderer
+
+from .exports import (EXPORT_FORMATS, delimited_lines, gzip_stream,
+                      ndjson_lines, rows_to_table, table_to_bytes)
+
+
+def _rows(data):
+    '''
+    Split serialised API data (a list of dicts, or a page of them) into
+    field names and rows.
+    '''
+    if isinstance(data, dict):
+        data = data['results'] if 'results' in data else [data]
+    fields = list(data[0].keys()) if data else []
+    return fields, [tuple(item.get(field) for field in fields) for item in data]
+
+
+class ParquetRenderer(BaseRenderer):
+    media_type = EXPORT_FORMATS['parquet'][0]
+    format = 'parquet'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return table_to_bytes(rows_to_table(*_rows(data)), 'parquet')
+
+
+class ArrowRenderer(BaseRenderer):
+    media_type = EXPORT_FORMATS['arrow'][0]
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return table_to_bytes(rows_to_table(*_rows(data)), 'arrow')
+
+
+class TSVGzipRenderer(BaseRenderer):
+    media_type = EXPORT_FORMATS['tsv.gz'][0]
+    format = 'tsv.gz'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        fields, rows = _rows(data)
+        return b''.join(
+            gzip_stream(delimited_lines(fields, rows, delimiter='\t')))
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = data['results'] if 'results' in data else [data]
+        return b''.join(ndjson_lines(data))
@@ -0,0 +1,30 @@
+CACHE_DATABASE = 'cache'
+
+
+class CacheRouter:
+    '''
+    Database router keeping the shared cache (see cache_backend.py) in its
+    own database, so that cache writes do not take the write lock of the
+    portal database. Create its table with migrate --database cache.
+    '''
+
+    @staticmethod
+    def _is_cache(model) -> bool:
+        return model._meta.app_label == 'main' \
+            and model._meta.model_name == 'cacheentry'
+
+    def db_for_read(self, model, **hints):
+        return CACHE_DATABASE if self._is_cache(model) else None
+
+    def db_for_write(self, model, **hints):
+        return CACHE_DATABASE if self._is_cache(model) else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'main' and model_name == 'cacheentry':
+            return db == CACHE_DATABASE
+        if db == CACHE_DATABASE:
+            return False
+        return None
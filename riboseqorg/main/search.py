@@ -0,0 +1,290 @@
+import re
+from typing import List, Tuple, Type
+
+from django.db import connection
+from django.db.models import IntegerField, Model
+
+# Weight given to a match in each field when ranking results. Fields that
+# are not listed are indexed with a weight of 1.
+STUDY_SEARCH_WEIGHTS = {
+    'BioProject': 10.0,
+    'Name': 6.0,
+    'Title': 6.0,
+    'ScientificName': 5.0,
+    'GSE': 5.0,
+    'SRA': 5.0,
+    'PMID': 5.0,
+    'Authors': 3.0,
+    'Publication_title': 3.0,
+    'Journal': 2.0,
+}
+
+SAMPLE_SEARCH_WEIGHTS = {
+    'Run': 10.0,
+    'GEO': 6.0,
+    'Experiment': 6.0,
+    'BioSample': 6.0,
+    'ScientificName': 5.0,
+    'CELL_LINE': 5.0,
+    'TISSUE': 5.0,
+    'INHIBITOR': 4.0,
+    'LIBRARYTYPE': 3.0,
+    'GENE': 3.0,
+    'CONDITION': 3.0,
+    'sample_title': 2.0,
+    'SampleName': 2.0,
+}
+
+# Fields left out of the index, as they were left out of the original
+# per-field search
+STUDY_SEARCH_EXCLUDE = ['sample']
+SAMPLE_SEARCH_EXCLUDE = [
+    'verified',
+    'trips_id',
+    'gwips_id',
+    'ribocrypt_id',
+    'readfile',
+    'BioProject',
+]
+
+
+def search_fields(model: Type[Model]) -> List[str]:
+    '''
+    Return the text fields of a model that are full-text indexed, most
+    heavily weighted first.
+
+    Arguments:
+    - model (Model): Study or Sample
+
+    Returns:
+    - (list): the field names
+    '''
+    weights, exclude = _search_config(model)
+    fields = [
+        field.name for field in model._meta.concrete_fields
+        if field.get_internal_type() in ('CharField', 'TextField')
+        and not field.is_relation and field.name not in exclude
+    ]
+    return sorted(fields, key=lambda name: -weights.get(name, 1.0))
+
+
+def _search_config(model: Type[Model]):
+    # Compared by name so that migrations can pass historical models
+    if model._meta.model_name == 'study':
+        return STUDY_SEARCH_WEIGHTS, STUDY_SEARCH_EXCLUDE
+    return SAMPLE_SEARCH_WEIGHTS, SAMPLE_SEARCH_EXCLUDE
+
+
+def fts_columns(model: Type[Model]) -> List[Tuple[str, float]]:
+    '''
+    Return the (column, weight) pairs of the FTS table of a model, in
+    declaration order. The primary key is stored unindexed, with a weight
+    of 0, when it is not itself searchable.
+    '''
+    weights, _ = _search_config(model)
+    columns = [
+        (model._meta.get_field(name).column, weights.get(name, 1.0))
+        for name in search_fields(model)
+    ]
+    key = model._meta.pk.column
+    if key not in [column for column, _ in columns]:
+        columns.insert(0, (key, 0.0))
+    return columns
+
+
+def fts_table(model: Type[Model]) -> str:
+    return f"{model._meta.db_table}_fts"
+
+
+def fts_available(model: Type[Model]) -> bool:
+    '''
+    Check the full-text index of a model exists (it is only created on
+    SQLite builds with FTS5).
+    '''
+    if connection.vendor != 'sqlite':
+        return False
+    return fts_table(model) in connection.introspection.table_names()
+
+
+def fts_statements(
+        table: str,
+        fts: str,
+        columns: List[Tuple[str, float]],
+        key: str,
+        integer_key: bool) -> List[str]:
+    '''
+    Return the SQL creating the FTS5 table of a model table, the triggers
+    keeping it in sync (so fixture loads are indexed as they are inserted)
+    and filling it from the existing rows.
+
+    Tables with an integer primary key are indexed as external content,
+    keyed by that key. Others (Study, keyed by BioProject) have only an
+    implicit rowid, which VACUUM may renumber, so their FTS table stores
+    its own copy of the text and is kept in sync by key.
+
+    Arguments:
+    - table (str): the model table
+    - fts (str): the FTS table
+    - columns (list): the (column, weight) pairs, see fts_columns
+    - key (str): the primary key column, one of the columns
+    - integer_key (bool): whether the primary key is an integer
+
+    Returns:
+    - (list): the statements, in order
+    '''
+    definitions = ', '.join(
+        f'"{column}"' + (' UNINDEXED' if weight == 0.0 else '')
+        for column, weight in columns
+    )
+    names = ', '.join(f'"{column}"' for column, _ in columns)
+    new_values = ', '.join(f'new."{column}"' for column, _ in columns)
+    old_values = ', '.join(f'old."{column}"' for column, _ in columns)
+
+    if integer_key:
+        return [
+            f'CREATE VIRTUAL TABLE "{fts}" USING fts5({definitions}, '
+            f"content='{table}', content_rowid='{key}', prefix='2 3')",
+            f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"(rowid, {names}) '
+            f'VALUES (new."{key}", {new_values}); END',
+            f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"("{fts}", rowid, {names}) '
+            f"VALUES ('delete', old.\"{key}\", {old_values}); END",
+            f'CREATE TRIGGER "{fts}_au" AFTER UPDATE ON "{table}" BEGIN '
+            f'INSERT INTO "{fts}"("{fts}", rowid, {names}) '
+            f"VALUES ('delete', old.\"{key}\", {old_values}); "
+            f'INSERT INTO "{fts}"(rowid, {names}) '
+            f'VALUES (new."{key}", {new_values}); END',
+            f'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')',
+        ]
+    return [
+        f'CREATE VIRTUAL TABLE "{fts}" USING fts5({definitions}, '
+        f"prefix='2 3')",
+        f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}"({names}) VALUES ({new_values}); END',
+        f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+        f'DELETE FROM "{fts}" WHERE "{key}" = old."{key}"; END',
+        f'CREATE TRIGGER "{fts}_au" AFTER UPDATE ON "{table}" BEGIN '
+        f'DELETE FROM "{fts}" WHERE "{key}" = old."{key}"; '
+        f'INSERT INTO "{fts}"({names}) VALUES ({new_values}); END',
+        f'INSERT INTO "{fts}"({names}) SELECT {names} FROM "{table}"',
+    ]
+
+
+def create_fts_index(model: Type[Model], schema_editor=None) -> None:
+    '''
+    (Re)create the FTS5 table mirroring the text fields of a model, with
+    its triggers (see fts_statements).
+
+    Arguments:
+    - model (Model): Study or Sample
+    - schema_editor: the schema editor, if run from a migration
+    '''
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor != 'sqlite':
+        return
+    key = model._meta.pk
+    statements = fts_statements(
+        model._meta.db_table, fts_table(model), fts_columns(model),
+        key.column, isinstance(key, IntegerField))
+
+    drop_fts_index(model, schema_editor)
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_fts_index(model: Type[Model], schema_editor=None) -> None:
+    '''
+    Drop the FTS5 table of a model and its triggers.
+    '''
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor != 'sqlite':
+        return
+    fts = fts_table(model)
+    with conn.cursor() as cursor:
+        for suffix in ['ai', 'ad', 'au']:
+            cursor.execute(f'DROP TRIGGER IF EXISTS "{fts}_{suffix}"')
+        cursor.execute(f'DROP TABLE IF EXISTS "{fts}"')
+
+
+def query_words(text: str) -> List[str]:
+    '''
+    Split text into lower case words the way the FTS5 unicode61 tokenizer
+    does (underscores and punctuation separate words).
+    '''
+    return re.findall(r'[^\W_]+', text.lower())
+
+
+def build_match_expression(query: str) -> str:
+    '''
+    Turn a user query into an FTS5 MATCH expression. Every word must match
+    (implicitly ANDed) and may be the prefix of an indexed term.
+
+    Arguments:
+    - query (str): the search box contents
+
+    Returns:
+    - (str): the MATCH expression, empty if the query has no words
+    '''
+    return ' '.join(f'"{word}"*' for word in query_words(query))
+
+
+class SearchResults:
+    '''
+    Ranked full-text search results for a model.
+
+    Ranking only fetches the primary keys; model instances are loaded when
+    a slice is taken, so paginating the results loads a single page.
+    '''
+
+    def __init__(self, model: Type[Model], query: str):
+        self.model = model
+        self.words = query_words(query)
+        self.keys = self._ranked_keys(build_match_expression(query))
+
+    def _ranked_keys(self, expression: str) -> list:
+        if not expression:
+            return []
+        fts = fts_table(self.model)
+        key = self.model._meta.pk.column
+        weights = ', '.join(str(weight) for _, weight in fts_columns(self.model))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT "{key}" FROM "{fts}" WHERE "{fts}" MATCH %s '
+                f'ORDER BY bm25("{fts}", {weights})',
+                [expression],
+                )
+            return [row[0] for row in cursor.fetchall()]
+
+    def count(self) -> int:
+        return len(self.keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        keys = self.keys[index]
+        objects = self.model.objects.in_bulk(keys)
+        results = [objects[key] for key in keys if key in objects]
+        for obj in results:
+            self.annotate_match(obj)
+        return results
+
+    def annotate_match(self, obj: Model) -> None:
+        '''
+        Record on obj the most heavily weighted field matching every word
+        of the query, as match_field and match_value.
+        '''
+        obj.match_field = ''
+        obj.match_value = ''
+        for name in search_fields(self.model):
+            value = str(getattr(obj, name) or '')
+            terms = query_words(value)
+            if all(any(term.startswith(word) for term in terms)
+                   for word in self.words):
+                obj.match_field = name
+                obj.match_value = value
+                return
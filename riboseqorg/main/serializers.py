@@ -4,12 +4,23 @@ from .models import Sample, Study
 
 
 class SampleSerializer(serializers.ModelSerializer):
+    # Links to the processed files of the run, only read when selected
+    fastqc_link = serializers.ReadOnlyField()
+    fastp_link = serializers.ReadOnlyField()
+    adapter_report_link = serializers.ReadOnlyField()
+    ribometric_link = serializers.ReadOnlyField()
+    reads_link = serializers.ReadOnlyField()
+    counts_link = serializers.ReadOnlyField()
+    bam_link = serializers.ReadOnlyField()
+    bigwig_forward_link = serializers.ReadOnlyField()
+    bigwig_reverse_link = serializers.ReadOnlyField()
+
     class Meta:
         model = Sample
-        fields = '__all__'  # This is a default, it might not be needed if you dynamically set the fields in the view
+        fields = '__all__'
 
     def __init__(self, *args, **kwargs):
-        # Dynamically set the fields based on the Meta.fields attribute
+        # Only serialise the given fields, in the given order
         fields = kwargs.pop('fields', None)
         super().__init__(*args, **kwargs)
         if fields:
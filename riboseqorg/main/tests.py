@@ -1,10 +1,46 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase as BaseTestCase
+
+from .bitmap_index import get_sample_index
+from .cache_backend import SharedCache
+from .data_version import get_data_version
+from .exports import columnar_available
+from .field_registry import get_model_fields
+from .filter_compiler import compile_filter, querystring_spec
+from .management.commands.build_artifact_manifest import scan_artifacts
+from .membership import BULK_THRESHOLD, in_values, release_values
+from .models import (GWIPS, Artifact, CacheEntry, RiboCrypt, Sample, Study,
+                     Trips, ViewerLink, get_artifact_links,
+                     prefetch_artifact_links)
+from .page_cache import cached_stream, fragment_key, fragment_stats
+from .references import CATALOGUE_KEY, refresh_reference_catalogue
+from .routers import CACHE_DATABASE
+from .search import SearchResults, build_match_expression
+from .serializers import SampleSerializer
+from .utilities import VOCABULARY, keyset_iterator, resolve_viewer_links
+from .viewer_links import (refresh_pending_links, refresh_viewer_links,
+                           viewer_links)
 
 # Create your tests here.
 
 # from views import *
 
 
+class TestCase(BaseTestCase):
+    # Pages and APIs use the shared cache, which has its own database
+    databases = {'default', CACHE_DATABASE}
+
+
 class TestViews(TestCase):
     def test_index(self):
         response = self.client.get('/')
@@ -20,4 +56,756 @@ class TestViews(TestCase):
 
     def test_studies(self):
         response = self.client.get('/studies/')
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+
+
+class TestArtifactManifest(TestCase):
+    def test_scan_prefers_exact_run(self):
+        with tempfile.TemporaryDirectory() as base:
+            os.makedirs(os.path.join(base, 'bams', 'SRR123'))
+            os.makedirs(os.path.join(base, 'bigwig', 'SRR123'))
+            for name in ['SRR1234_1.bam', 'SRR1234.bam', 'SRR1235_1.bam']:
+                open(os.path.join(base, 'bams', 'SRR123', name), 'w').close()
+            open(os.path.join(
+                base, 'bigwig', 'SRR123', 'SRR1234_pshifted_forward.bigWig'
+                ), 'w').close()
+            found = scan_artifacts(base)
+        self.assertEqual(found, {
+            ('SRR1234', 'bams'): 'SRR1234.bam',
+            ('SRR1235', 'bams'): 'SRR1235_1.bam',
+            ('SRR1234', 'bigwig (forward)'): 'SRR1234_pshifted_forward.bigWig',
+        })
+
+    def test_sample_links_use_manifest(self):
+        Artifact.objects.create(
+            Run='SRR1234', file_type='bams', file_name='SRR1234.bam')
+        sample = Sample.objects.create(Run='SRR1234')
+        prefetch_artifact_links([sample])
+        self.assertEqual(
+            sample.bam_link,
+            'https://rdp.ucc.ie/static2/bams/SRR123/SRR1234.bam')
+        self.assertEqual(sample.reads_link, '')
+
+    def test_links_of_many_runs(self):
+        Artifact.objects.create(
+            Run='SRR1234', file_type='bams', file_name='SRR1234.bam')
+        runs = [f'SRR{number}' for number in range(2 * BULK_THRESHOLD + 1)]
+        runs.append('SRR1234')
+        with self.assertNumQueries(3):
+            links = get_artifact_links(runs)
+        self.assertEqual(len(links), len(set(runs)))
+        self.assertEqual(list(links['SRR1234']), ['bams'])
+
+    def test_report_links_use_manifest(self):
+        Artifact.objects.create(
+            Run='SRR1234', file_type='fastp', file_name='SRR1234_1.html')
+        response = self.client.get('/reports/SRR1234')
+        self.assertEqual(
+            response.context['fastp'],
+            'https://rdp.ucc.ie/static2/fastp/SRR123/SRR1234_1.html')
+        self.assertIsNone(response.context['fastqc'])
+
+    def test_manifest_checksums(self):
+        with tempfile.TemporaryDirectory() as base:
+            os.makedirs(os.path.join(base, 'bams', 'SRR123'))
+            with open(os.path.join(base, 'bams', 'SRR123', 'SRR1234.bam'),
+                      'w') as handle:
+                handle.write('reads')
+            call_command(
+                'build_artifact_manifest', base=base, stdout=io.StringIO())
+            artifact = Artifact.objects.get()
+            self.assertEqual((artifact.size, artifact.md5), (5, ''))
+            call_command(
+                'build_artifact_manifest', base=base, checksums=True,
+                stdout=io.StringIO())
+        self.assertEqual(
+            Artifact.objects.get().md5, '0fb9cf5f04f61bb6f1151da57ceb1ca1')
+
+
+class TestFacets(TestCase):
+    def setUp(self):
+        for cell_line, inhibitor in [
+                ('HeLa', 'CHX'), ('HeLa', 'LTM'), ('HEK293', 'CHX'),
+                ('', 'CHX')]:
+            Sample.objects.create(CELL_LINE=cell_line, INHIBITOR=inhibitor)
+
+    def test_counts_exclude_own_field(self):
+        facets = get_sample_index().facet_counts(
+            {'CELL_LINE': ['HeLa']}, ['CELL_LINE', 'INHIBITOR'])
+        # The selected field still counts every cell line
+        self.assertEqual(facets['CELL_LINE'], [
+            {'value': 'HeLa', 'count': 2},
+            {'value': 'HEK293', 'count': 1},
+            {'value': 'None', 'count': 1},
+        ])
+        # Other fields are restricted to the selection
+        self.assertEqual(facets['INHIBITOR'], [
+            {'value': 'CHX', 'count': 1},
+            {'value': 'LTM', 'count': 1},
+        ])
+
+    def test_rows_failing_two_fields_are_ignored(self):
+        facets = get_sample_index().facet_counts(
+            {'CELL_LINE': ['HEK293'], 'INHIBITOR': ['LTM']},
+            ['CELL_LINE', 'INHIBITOR'])
+        self.assertEqual(facets['CELL_LINE'], [{'value': 'HeLa', 'count': 1}])
+        self.assertEqual(facets['INHIBITOR'], [{'value': 'CHX', 'count': 1}])
+
+    def test_bitmap_index_matches_query(self):
+        selection = {'CELL_LINE': ['HeLa', 'HEK293'], 'INHIBITOR': ['CHX']}
+        index = get_sample_index()
+        self.assertEqual(index.count(selection), 2)
+        self.assertEqual(
+            sorted(index.match(selection).tolist()),
+            sorted(Sample.objects.filter(
+                CELL_LINE__in=['HeLa', 'HEK293'], INHIBITOR='CHX'
+                ).values_list('pk', flat=True)))
+
+    def test_bitmap_index_rebuilt_on_change(self):
+        before = get_sample_index().count({'TISSUE': ['Liver']})
+        Sample.objects.create(TISSUE='Liver')
+        self.assertEqual(
+            get_sample_index().count({'TISSUE': ['Liver']}), before + 1)
+
+    def test_fragment_key_is_canonical(self):
+        key = fragment_key(
+            'samples', 'ids', {'CELL_LINE': ['HeLa', 'HEK293'],
+                               'trips_id': [True]})
+        self.assertEqual(key, fragment_key(
+            'samples', 'ids', {'trips_id': [True],
+                               'CELL_LINE': ['HEK293', 'HeLa', 'HeLa']}))
+        Sample.objects.create(CELL_LINE='HeLa')
+        self.assertNotEqual(key, fragment_key(
+            'samples', 'ids', {'CELL_LINE': ['HeLa', 'HEK293'],
+                               'trips_id': [True]}))
+
+    def test_samples_page_follows_data(self):
+        response = self.client.get('/samples', {'Cell-Line': 'HeLa'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+        Sample.objects.create(CELL_LINE='HeLa', INHIBITOR='CHX')
+        response = self.client.get('/samples', {'Cell-Line': 'HeLa'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 3)
+
+    def test_samples_page_ordered_in_sql(self):
+        response = self.client.get('/samples')
+        page = list(response.context['page_obj'])
+        self.assertEqual(
+            [sample.pk for sample in page],
+            list(Sample.objects.order_by(
+                '-INHIBITOR', '-LIBRARYTYPE', '-pk'
+                ).values_list('pk', flat=True)))
+        self.assertIn('Info', page[0].get_deferred_fields())
+
+
+class TestSearch(TestCase):
+    def setUp(self):
+        Study.objects.create(BioProject='PRJNA1', Title='Ribosome profiling')
+        Study.objects.create(
+            BioProject='PRJNA2', Name='Stress', Study_abstract='ribosomes')
+        Sample.objects.create(Run='SRR100', CELL_LINE='HeLa')
+        Sample.objects.create(Run='SRR200', sample_title='HeLa control')
+
+    def test_match_expression(self):
+        self.assertEqual(
+            build_match_expression('homo_sapiens "HeLa'),
+            '"homo"* "sapiens"* "hela"*')
+
+    def test_prefix_match_ranked_by_field_weight(self):
+        results = SearchResults(Study, 'riboso')
+        self.assertEqual(results.keys, ['PRJNA1', 'PRJNA2'])
+        results = SearchResults(Sample, 'hel')
+        self.assertEqual([sample.Run for sample in results[0:2]],
+                         ['SRR100', 'SRR200'])
+        self.assertEqual(results[1].match_field, 'sample_title')
+
+    def test_index_follows_updates(self):
+        sample = Sample.objects.get(Run='SRR100')
+        sample.CELL_LINE = 'HEK293'
+        sample.save()
+        self.assertEqual(len(SearchResults(Sample, 'hek293')), 1)
+        sample.delete()
+        self.assertEqual(len(SearchResults(Sample, 'hek293')), 0)
+
+    def test_study_index_is_keyed_by_bioproject(self):
+        study = Study.objects.get(BioProject='PRJNA1')
+        study.Name = 'Translatome atlas'
+        study.save()
+        self.assertEqual(SearchResults(Study, 'translatome').keys, ['PRJNA1'])
+        study.delete()
+        self.assertEqual(SearchResults(Study, 'translatome').keys, [])
+
+
+class TestMetadataExport(TestCase):
+    def setUp(self):
+        study = Study.objects.create(BioProject='PRJNA1')
+        for i in range(5):
+            Sample.objects.create(
+                Run=f'SRR{i}', BioProject=study, INHIBITOR='CHX')
+
+    def test_keyset_iterator_reads_every_row(self):
+        rows = list(keyset_iterator(Sample.objects.all(), ['Run'], 2))
+        self.assertEqual(rows, [(f'SRR{i}',) for i in range(5)])
+
+    def test_csv_is_streamed(self):
+        response = self.client.get(
+            '/generate-csv/', {'bioproject': 'PRJNA1'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].startswith(',False,PRJNA1,,SRR0,'))
+
+    def test_tsv_gzip(self):
+        response = self.client.get(
+            '/generate-csv/', {'bioproject': 'PRJNA1', 'format': 'tsv.gz'})
+        content = b''.join(response.streaming_content)
+        lines = gzip.decompress(content).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertIn('\tSRR0\t', lines[1])
+
+    @unittest.skipUnless(columnar_available(), 'pyarrow is not installed')
+    def test_parquet_types(self):
+        import io
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        Sample.objects.filter(Run='SRR0').update(spots=1200)
+        response = self.client.get(
+            '/generate-csv/', {'bioproject': 'PRJNA1', 'format': 'parquet'})
+        table = pq.read_table(io.BytesIO(response.content))
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.schema.field('spots').type, pa.int64())
+        self.assertTrue(pa.types.is_dictionary(
+            table.schema.field('INHIBITOR').type))
+        self.assertEqual(table.column('spots').to_pylist()[0], 1200)
+
+    @unittest.skipUnless(columnar_available(), 'pyarrow is not installed')
+    def test_api_arrow(self):
+        import pyarrow as pa
+
+        response = self.client.get(
+            '/api/samples/', {'format': 'arrow', 'fields': 'Run,spots'})
+        table = pa.ipc.open_file(pa.py_buffer(response.content)).read_all()
+        self.assertEqual(sorted(table.column('Run').to_pylist()),
+                         [f'SRR{i}' for i in range(5)])
+
+    def test_unknown_format(self):
+        response = self.client.get(
+            '/generate-csv/', {'bioproject': 'PRJNA1', 'format': 'xls'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestViewerLinks(TestCase):
+    def setUp(self):
+        study = Study.objects.create(BioProject='PRJNA1')
+        for run, inhibitor in [('SRR1', 'CHX'), ('SRR2', 'LTM'), ('SRR3', '')]:
+            Sample.objects.create(
+                Run=run, BioProject=study, ScientificName='homo_sapiens',
+                INHIBITOR=inhibitor, gwips_id=run != 'SRR3')
+        for run, trips_id in [('SRR1', '101.0'), ('SRR2', '102.0')]:
+            Trips.objects.create(
+                BioProject='PRJNA1', Run=run, Trips_id=trips_id,
+                organism='homo_sapiens', transcriptome='gencode_v25')
+        GWIPS.objects.create(
+            BioProject='PRJNA1', Organism='homo_sapiens', gwips_db='hg38',
+            GWIPS_Elong_Suffix='Elong', GWIPS_Init_Suffix='Init')
+        RiboCrypt.objects.create(
+            BioProject='PRJNA1', Organism='homo sapiens',
+            ribocrypt_id='all_samples', Run='SRR1')
+
+    def test_study_page_links(self):
+        links = resolve_viewer_links(Sample.objects.all(), ['PRJNA1'])
+        trips = ('https://trips.ucc.ie/homo_sapiens/gencode_v25/'
+                 'interactive_plot/')
+        gwips = 'https://gwips.ucc.ie/cgi-bin/hgTracks?db=hg38'
+        ribocrypt = ('https://ribocrypt.org/?dff=all_samples-homo_sapiens'
+                     '&library=SRR1&go=TRUE&go=TRUE')
+        self.assertEqual(links['projects']['PRJNA1'], {
+            'trips_link': f'{trips}?files=101,102',
+            'trips_name': 'Visit Trips-Viz',
+            'gwips_link': f'{gwips}&Elong=full&Init=full',
+            'gwips_name': 'Visit GWIPS-viz',
+            'ribocrypt_link': ribocrypt,
+            'ribocrypt_name': 'Visit RiboCrypt',
+        })
+        self.assertEqual(links['runs']['SRR2'], {
+            'trips_link': f'{trips}?files=102',
+            'trips_name': 'Visit Trips-Viz',
+            'gwips_link': f'{gwips}&Elong=full&Init=full',
+            'gwips_name': 'Visit GWIPS-viz',
+            'ribocrypt_link': 'https://ribocrypt.org/',
+            'ribocrypt_name': '',
+        })
+        self.assertEqual(links['runs']['SRR3'], {
+            'trips_link': 'https://trips.ucc.ie/',
+            'trips_name': '',
+            'gwips_link': 'https://gwips.ucc.ie/',
+            'gwips_name': '',
+            'ribocrypt_link': 'https://ribocrypt.org/',
+            'ribocrypt_name': '',
+        })
+
+    def test_run_selection_links(self):
+        links = resolve_viewer_links(Sample.objects.all(), by_inhibitor=True)
+        gwips = {
+            run: links['runs'][run]['gwips_link'].split('db=hg38&')[1]
+            for run in ['SRR1', 'SRR2', 'SRR3']
+        }
+        self.assertEqual(gwips, {
+            'SRR1': 'Elong=full', 'SRR2': 'Init=full', 'SRR3': 'Elong=full'})
+
+    def test_mixed_case_initiation_inhibitor(self):
+        Sample.objects.filter(Run='SRR2').update(INHIBITOR='Lactimidomycin')
+        links = resolve_viewer_links(Sample.objects.all(), by_inhibitor=True)
+        self.assertTrue(links['runs']['SRR2']['gwips_link'].endswith(
+            'db=hg38&Init=full'))
+        response = self.client.get('/links/', {'run': ['SRR2']})
+        self.assertEqual(response.context['gwips'][0]['files'], 'Init=full')
+
+    def test_links_page_panels(self):
+        hits = fragment_stats['links']['hits']
+        for page in ['1', '2']:
+            response = self.client.get(
+                '/links/', {'run': ['SRR1', 'SRR2'], 'page': page})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(fragment_stats['links']['hits'], hits + 1)
+        self.assertEqual(response.context['trips'][0]['files'], 'files=101,102')
+        self.assertEqual(
+            response.context['gwips'][0]['files'], 'Init=full&Elong=full')
+
+    def test_materialised_links(self):
+        refresh_viewer_links()
+        self.assertEqual(ViewerLink.objects.count(), 4)
+        samples = list(Sample.objects.all())
+        for by_inhibitor in [False, True]:
+            with self.assertNumQueries(1):
+                links = viewer_links(samples, ['PRJNA1'], by_inhibitor)
+            self.assertEqual(
+                links,
+                resolve_viewer_links(samples, ['PRJNA1'], by_inhibitor))
+
+    def test_links_refreshed_on_change(self):
+        refresh_viewer_links()
+        Trips.objects.create(
+            BioProject='PRJNA1', Run='SRR3', Trips_id='103.0',
+            organism='homo_sapiens', transcriptome='gencode_v25')
+        self.assertIn('SRR3', connection.pending_links['runs'])
+        # run by the commit of the enclosing transaction outside tests
+        refresh_pending_links()
+        self.assertFalse(connection.pending_links['runs'])
+        link = ViewerLink.objects.get(Run='SRR3')
+        self.assertTrue(link.trips_link.endswith('files=103'))
+        project = ViewerLink.objects.get(BioProject='PRJNA1', Run='')
+        self.assertTrue(project.trips_link.endswith('files=101,102,103'))
+
+
+class TestDataVersion(TestCase):
+    def test_rolled_back_changes_are_forgotten(self):
+        before = get_data_version()
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Study.objects.create(BioProject='PRJNA1')
+                during = get_data_version()
+                self.assertNotEqual(during, before)
+                Study.objects.create(BioProject='PRJNA1')
+        self.assertEqual(get_data_version(), before)
+        Study.objects.create(BioProject='PRJNA1')
+        self.assertNotIn(get_data_version(), [before, during])
+
+
+class TestQueryPlans(TestCase):
+    def test_hot_queries_use_indexes(self):
+        call_command('check_query_plans', stdout=io.StringIO())
+
+    def test_run_is_unique(self):
+        Sample.objects.create(Run='')
+        Sample.objects.create(Run='')
+        Sample.objects.create(Run='SRR1')
+        with self.assertRaises(IntegrityError):
+            Sample.objects.create(Run='SRR1')
+
+
+class TestSharedCache(TestCase):
+    def setUp(self):
+        self.cache = SharedCache(None, {
+            'OPTIONS': {'MAX_ENTRIES': 2, 'TOUCH_INTERVAL': 0,
+                        'CULL_EVERY': 1}})
+
+    def test_round_trip_compressed(self):
+        value = {'ids': list(range(1000)) * 10}
+        self.cache.set('ids', value)
+        self.assertEqual(self.cache.get('ids'), value)
+        self.assertLess(CacheEntry.objects.get().size, 10000)
+        self.assertEqual(CacheEntry.objects.db, CACHE_DATABASE)
+        self.assertFalse(self.cache.add('ids', []))
+        self.cache.set('gone', 1, timeout=0)
+        self.assertIsNone(self.cache.get('gone'))
+
+    def test_least_recently_read_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.stats()['entries'], 2)
+
+    def test_view_counters(self):
+        self.client.get('/samples')
+        self.client.get('/samples')
+        response = self.client.get('/api/cache/', {'format': 'json'})
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(User.objects.create_user(
+            'admin', password='admin', is_staff=True))
+        stats = self.client.get('/api/cache/', {'format': 'json'}).json()
+        self.assertGreaterEqual(stats['views']['samples']['hits'], 2)
+
+
+class TestSamplesAPI(TestCase):
+    def setUp(self):
+        study = Study.objects.create(BioProject='PRJNA1')
+        for i in range(5):
+            Sample.objects.create(
+                Run=f'SRR{i}', BioProject=study, CELL_LINE='HeLa',
+                INHIBITOR='CHX')
+
+    def test_cursor_pages(self):
+        runs = []
+        url = '/api/samples/?format=json&page_size=2&CELL_LINE=HeLa'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            runs += [sample['Run'] for sample in page['results']]
+            url = page['next']
+        self.assertEqual(runs, [f'SRR{i}' for i in range(5)])
+
+    def test_cursor_pages_with_tied_ordering(self):
+        for _ in range(3):
+            Sample.objects.create(Run='', CELL_LINE='HeLa')
+        expected = list(Sample.objects.order_by('-Run', 'id').values_list(
+            'id', flat=True))
+        ids = []
+        url = '/api/samples/?format=json&page_size=2&ordering=-Run&fields=id'
+        while url:
+            page = self.client.get(url).json()
+            ids += [sample['id'] for sample in page['results']]
+            url = page['next']
+        self.assertEqual(ids, expected)
+
+    def test_limit_without_cursor(self):
+        response = self.client.get(
+            '/api/samples/', {'format': 'json', 'limit': 3})
+        self.assertEqual(len(response.json()), 3)
+
+    def test_fields_are_per_request(self):
+        response = self.client.get('/api/samples/', {
+            'format': 'json', 'fields': 'bam_link,Run,Run,unknown'})
+        self.assertEqual(list(response.json()[0]), ['bam_link', 'Run'])
+        response = self.client.get('/api/samples/', {'format': 'json'})
+        self.assertEqual(
+            list(response.json()[0]),
+            ['Run', 'BioProject', 'CELL_LINE', 'INHIBITOR', 'TISSUE',
+             'LIBRARYTYPE'])
+        self.assertEqual(SampleSerializer.Meta.fields, '__all__')
+
+    def test_ndjson_matches_json(self):
+        params = {'fields': 'Run,BioProject,bam_link,verified', 'limit': 10}
+        expected = self.client.get(
+            '/api/samples/', {**params, 'format': 'json'}).json()
+        response = self.client.get(
+            '/api/samples/', {**params, 'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_ndjson_is_searched_and_ordered(self):
+        params = {'fields': 'Run', 'search': 'SRR1', 'ordering': '-Run',
+                  'CELL_LINE': 'HeLa', 'limit': 1}
+        expected = self.client.get(
+            '/api/samples/', {**params, 'format': 'json'}).json()
+        self.assertEqual(expected, [{'Run': 'SRR1'}])
+        response = self.client.get(
+            '/api/samples/', {**params, 'format': 'ndjson'})
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+
+class TestFieldRegistry(TestCase):
+    def test_matches_model_meta(self):
+        fields = get_model_fields(Sample)
+        self.assertEqual(
+            fields.names,
+            tuple(field.name for field in Sample._meta.get_fields()))
+        self.assertIn('Run', fields)
+        self.assertNotIn('bam_link', fields)
+        self.assertEqual(fields.by_name['CELL_LINE'].clean_name, 'Cell-Line')
+        self.assertTrue(fields.by_name['CELL_LINE'].facetable)
+        self.assertTrue(get_model_fields(Study).by_name['Title'].searchable)
+        with self.assertRaises(TypeError):
+            fields.by_name['Run'] = None
+
+
+class TestVocabulary(TestCase):
+    def test_both_directions(self):
+        self.assertEqual(VOCABULARY['CELL_LINE'], 'Cell-Line')
+        self.assertEqual(VOCABULARY.original('Cell-Line'), 'CELL_LINE')
+        self.assertEqual(VOCABULARY.original('run'), 'Run')
+        self.assertEqual(VOCABULARY.original('unknown'), 'unknown')
+        with self.assertRaises(TypeError):
+            VOCABULARY['CELL_LINE'] = 'Cell line'
+
+    def test_alias_only_renames_parameters(self):
+        self.assertEqual(
+            querystring_spec('run=SRR1&Cell-Line=brunner&trips_id=on'),
+            {'CELL_LINE': ('brunner',), 'Run': ('SRR1',),
+             'trips_id': (True,)})
+
+
+class TestFilterCompiler(TestCase):
+    def setUp(self):
+        published = Study.objects.create(BioProject='PRJNA1', PMID='123')
+        unpublished = Study.objects.create(BioProject='PRJNA2', PMID='')
+        Sample.objects.create(
+            Run='SRR1', BioProject=published, CELL_LINE='HeLa', trips_id=True)
+        Sample.objects.create(
+            Run='SRR2', BioProject=unpublished, CELL_LINE='HeLa')
+
+    def runs(self, query_string):
+        spec = querystring_spec(query_string)
+        return sorted(Sample.objects.filter(
+            compile_filter(spec)).values_list('Run', flat=True))
+
+    def test_equivalent_specs_compile_alike(self):
+        first = querystring_spec('Cell-Line=HeLa&Cell-Line=HEK&page=2')
+        second = querystring_spec('Cell-Line=HEK&CELL_LINE=HeLa')
+        self.assertEqual(first, second)
+        self.assertEqual(compile_filter(first), compile_filter(second))
+
+    def test_filters(self):
+        self.assertEqual(self.runs('Cell-Line=HeLa'), ['SRR1', 'SRR2'])
+        self.assertEqual(self.runs('trips_id=on'), ['SRR1'])
+        self.assertEqual(self.runs('PubMed=Available'), ['SRR1'])
+        self.assertEqual(self.runs('PubMed=Not+Available'), ['SRR2'])
+        self.assertEqual(self.runs('unknown=1'), ['SRR1', 'SRR2'])
+
+
+class TestMembership(TestCase):
+    def setUp(self):
+        study = Study.objects.create(BioProject='PRJNA1')
+        Sample.objects.bulk_create(
+            Sample(Run=f'SRR{number}', BioProject=study)
+            for number in range(BULK_THRESHOLD + 100)
+        )
+        self.runs = [f'SRR{number}' for number in range(0, 1000, 2)]
+        self.runs += ['SRR1', 'SRR1'] + [
+            f'ERR{number}' for number in range(BULK_THRESHOLD)]
+
+    def test_large_lists_use_value_table(self):
+        samples = Sample.objects.filter(in_values('Run', self.runs))
+        self.assertNotIn('ERR1', str(samples.query))
+        self.assertEqual(samples.count(), 301)
+        release_values()
+        with self.assertRaises(RuntimeError):
+            samples.count()
+
+    def test_links_and_export_by_runs(self):
+        # within the default limit of 1000 request parameters
+        runs = self.runs[:900]
+        self.assertGreater(len(set(runs)), BULK_THRESHOLD)
+        query = '&'.join(f'run={run}' for run in runs)
+        response = self.client.get(f'/links/?{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['sample_results'].paginator.count, 301)
+
+        response = self.client.get(f'/generate-csv/?{query}')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 302)
+
+
+class TestDownloads(TestCase):
+    def setUp(self):
+        study = Study.objects.create(BioProject='PRJNA1')
+        for run in ['SRR1', 'SRR2', 'SRR3']:
+            Sample.objects.create(Run=run, BioProject=study)
+        Artifact.objects.create(
+            Run='SRR1', file_type='reads',
+            file_name='SRR1.collapsed.fa.gz', md5='a' * 32)
+        Artifact.objects.create(
+            Run='SRR2', file_type='reads', file_name='SRR2.collapsed.fa.gz')
+        Artifact.objects.create(
+            Run='SRR1', file_type='bams', file_name='SRR1.bam')
+
+    def download(self, **params):
+        response = self.client.get(
+            '/download_all/', {'run': ['SRR1', 'SRR2', 'SRR3'], **params})
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_script_is_cached(self):
+        hits = fragment_stats['downloads']['hits']
+        response, script = self.download()
+        self.assertIn(
+            '  "/static2/collapsed_reads/SRR1/SRR1.collapsed.fa.gz"\n', script)
+        self.assertNotIn('SRR1.bam', script)
+        again, repeat = self.download()
+        self.assertEqual(repeat, script)
+        self.assertEqual(fragment_stats['downloads']['hits'], hits + 1)
+        self.assertEqual(
+            again['Content-Disposition'], response['Content-Disposition'])
+
+    def test_long_content_is_not_cached(self):
+        selection = {'run': ['SRR1']}
+        chunks = ['a' * 6, 'b' * 6]
+        sent = cached_stream('downloads', 'long', selection, chunks, limit=10)
+        self.assertEqual(''.join(sent), 'a' * 6 + 'b' * 6)
+        self.assertIsNone(
+            cache.get(fragment_key('downloads', 'long', selection)))
+
+    def test_modes(self):
+        url = 'https://rdp.ucc.ie/static2/collapsed_reads/SRR1/SRR1.collapsed.fa.gz'
+        _, urls = self.download(mode='urls')
+        self.assertEqual(urls.splitlines()[0], url)
+        _, aria2c = self.download(mode='aria2c')
+        self.assertEqual(
+            aria2c.splitlines()[:2], [url, '  checksum=md5=' + 'a' * 32])
+        _, md5 = self.download(mode='md5')
+        self.assertEqual(md5, f"{'a' * 32}  SRR1.collapsed.fa.gz\n")
+        response = self.client.get('/download_all/?run=SRR1&mode=zip')
+        self.assertEqual(response.status_code, 400)
+
+    def test_clean_download_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ['RiboSeqOrg_Download_old.sh',
+                         'RiboSeqOrg_Download_new.sh']:
+                open(os.path.join(directory, name), 'w').close()
+            old = os.path.join(directory, 'RiboSeqOrg_Download_old.sh')
+            os.utime(old, (0, 0))
+            call_command(
+                'clean_download_files', dir=directory, stdout=io.StringIO())
+            self.assertEqual(
+                os.listdir(directory), ['RiboSeqOrg_Download_new.sh'])
+
+
+class TestPivot(TestCase):
+    def setUp(self):
+        study = Study.objects.create(BioProject='PRJNA1')
+        for run, organism, librarytype in [
+                ('SRR1', 'homo_sapiens', 'Ribo-Seq'),
+                ('SRR2', 'homo_sapiens', 'Ribo-Seq'),
+                ('SRR3', 'homo_sapiens', 'RNA-Seq'),
+                ('SRR4', 'mus_musculus', 'Ribo-Seq')]:
+            Sample.objects.create(
+                Run=run, BioProject=study, ScientificName=organism,
+                LIBRARYTYPE=librarytype, CELL_LINE='HeLa' if run != 'SRR4' else '')
+
+    def test_grouped_counts(self):
+        response = self.client.get('/api/pivot/', {
+            'rows': 'ScientificName', 'cols': 'LIBRARYTYPE'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'rows': ['ScientificName'],
+            'cols': ['LIBRARYTYPE'],
+            'total': 4,
+            'data': [
+                ['homo_sapiens', 'RNA-Seq', 1],
+                ['homo_sapiens', 'Ribo-Seq', 2],
+                ['mus_musculus', 'Ribo-Seq', 1],
+            ],
+        })
+
+    def test_filters_and_cache(self):
+        params = {'rows': 'LIBRARYTYPE', 'Cell-Line': 'HeLa'}
+        hits = fragment_stats['pivot']['hits']
+        for _ in range(2):
+            response = self.client.get('/api/pivot/', params)
+        self.assertEqual(fragment_stats['pivot']['hits'], hits + 1)
+        self.assertEqual(
+            response.json()['data'], [['RNA-Seq', 1], ['Ribo-Seq', 2]])
+
+    def test_unknown_dimension(self):
+        response = self.client.get('/api/pivot/', {'rows': 'Run'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_ships_no_samples(self):
+        response = self.client.get('/pivot/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'SRR1', response.content)
+
+    def test_snapshot(self):
+        response = self.client.get('/api/pivot/snapshot/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=300', response['Cache-Control'])
+        snapshot = json.loads(response.content)
+        organisms = snapshot['dictionaries'][
+            snapshot['columns'].index('ScientificName')]
+        self.assertEqual(organisms, ['homo_sapiens', 'mus_musculus'])
+        self.assertEqual(len(snapshot['rows']), 4)
+
+        identity_etag = response['ETag']
+        response = self.client.get(
+            '/api/pivot/snapshot/', {'v': snapshot['version']},
+            HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=identity_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotEqual(response['ETag'], identity_etag)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), snapshot)
+
+        response = self.client.get(
+            '/api/pivot/snapshot/', {'v': snapshot['version']},
+            HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            '/api/pivot/snapshot/', HTTP_ACCEPT_ENCODING='gzip;q=0, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['ETag'], identity_etag)
+
+
+class TestReferences(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.add_organism('homo_sapiens', ['genome.fa', 'genes.gtf'])
+        self.add_organism('mus_musculus', ['genome.fa'])
+        cache.delete(CATALOGUE_KEY)
+
+    def add_organism(self, name, files):
+        os.makedirs(os.path.join(self.directory.name, name))
+        for file_name in files:
+            with open(os.path.join(self.directory.name, name, file_name),
+                      'w') as handle:
+                handle.write('ACGT')
+
+    def test_catalogue(self):
+        catalogue, rebuilt = refresh_reference_catalogue(
+            self.directory.name, checksums=True)
+        self.assertTrue(rebuilt)
+        self.assertEqual(catalogue['references'], [{
+            'name': 'Homo Sapiens',
+            'gtf': 'static2/references/homo_sapiens/genes.gtf',
+            'gtf_size': 4,
+            'gtf_md5': 'f1f8f4bf413b16ad135722aa4591043e',
+            'fasta': 'static2/references/homo_sapiens/genome.fa',
+            'fasta_size': 4,
+            'fasta_md5': 'f1f8f4bf413b16ad135722aa4591043e',
+        }])
+        self.assertFalse(
+            refresh_reference_catalogue(self.directory.name)[1])
+
+        self.add_organism('danio_rerio', ['genome.fa', 'genes.gtf'])
+        catalogue, rebuilt = refresh_reference_catalogue(self.directory.name)
+        self.assertTrue(rebuilt)
+        self.assertEqual(
+            [reference['name'] for reference in catalogue['references']],
+            ['Danio Rerio', 'Homo Sapiens'])
+        # checksums of unchanged files are kept
+        self.assertTrue(catalogue['references'][1]['gtf_md5'])
+        self.assertEqual(catalogue['references'][0]['gtf_md5'], '')
+
+    def test_page_reads_cache(self):
+        refresh_reference_catalogue(self.directory.name)
+        response = self.client.get('/references/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response, 'static2/references/homo_sapiens/genes.gtf')
@@ -63,6 +63,21 @@ urlpatterns = [
         views.SampleFieldsView.as_view(),
         name='api-sample-fields'
          ),
+    path(
+        'api/pivot/',
+        views.PivotView.as_view(),
+        name='api-pivot'
+        ),
+    path(
+        'api/pivot/snapshot/',
+        views.pivot_snapshot_data,
+        name='api-pivot-snapshot'
+        ),
+    path(
+        'api/cache/',
+        views.CacheStatsView.as_view(),
+        name='api-cache-stats'
+        ),
     path(
         'vocabularies/',
         views.vocabularies,
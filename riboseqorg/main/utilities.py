@@ -1,21 +1,53 @@
-from django.http import HttpRequest
-from django.db.models import Q
-from typing import List, Dict
+from django.db.models import Exists, OuterRef, Q
+from collections.abc import Mapping
+from itertools import groupby
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Iterator, Dict
 
-from .models import Sample, Trips, GWIPS, RiboCrypt
-import pandas as pd
+from .models import Trips, GWIPS, RiboCrypt
 
-import os
+import hashlib
+import re
 
 
-def get_clean_names() -> dict:
+class Vocabulary(Mapping):
     '''
-    Return a dictionary of clean names to original names as in database
+    Frozen bidirectional mapping between the original field names of the
+    database and the clean names shown on the site.
 
-    Returns:
-        clean_names: dictionary
+    Indexing by original name gives the clean name, like a dictionary;
+    original() maps a clean name (or an alias, eg. a lower case parameter
+    name) back to the original name.
     '''
-    clean_names = {
+
+    def __init__(self, clean_names: Dict[str, str], aliases: Dict[str, str]):
+        self._clean = MappingProxyType(dict(clean_names))
+        original: dict = {}
+        for name, clean_name in clean_names.items():
+            original.setdefault(clean_name, name)
+        original.update(aliases)
+        self._original = MappingProxyType(original)
+
+    def __getitem__(self, name: str) -> str:
+        return self._clean[name]
+
+    def __iter__(self):
+        return iter(self._clean)
+
+    def __len__(self) -> int:
+        return len(self._clean)
+
+    def original(self, name: str) -> str:
+        '''
+        Return the original name of a clean name or alias, or the name
+        itself if it is neither.
+        '''
+        return self._original.get(name, name)
+
+
+VOCABULARY = Vocabulary(
+    {
         'Run': 'Run Accession',
         'spots': 'Total Number of Spots (Original file))',
         'bases': 'Total Number of Bases (Original file)',
@@ -107,21 +139,36 @@ def get_clean_names() -> dict:
         'gwips_id': 'gwips_id',
         'ribocrypt_id': 'ribocrypt_id',
         'FASTA_file': 'FASTA_file',
-    }
-    return clean_names
+    },
+    aliases={
+        'run': 'Run',
+    },
+)
+
+
+def get_clean_names() -> Vocabulary:
+    '''
+    Return the mapping of original names as in database to clean names
+
+    Returns:
+        clean_names: the shared Vocabulary
+    '''
+    return VOCABULARY
 
 
-def get_original_name(name: str, clean_names: dict) -> str:
+def get_original_name(name: str, clean_names: Mapping = VOCABULARY) -> str:
     """
     Get the original name of a parameter from the clean name.
 
     Arguments:
     - name (str): the clean name of the parameter
-    - clean_names (dict): the dictionary of clean names to original names
+    - clean_names (Mapping): the mapping of original names to clean names
 
     Returns:
     - (str): the original name of the parameter
     """
+    if isinstance(clean_names, Vocabulary):
+        return clean_names.original(name)
     for original_name, clean_name in clean_names.items():
         if clean_name == name:
             return original_name
@@ -129,42 +176,6 @@ def get_original_name(name: str, clean_names: dict) -> str:
     return name
 
 
-def build_query(
-    request: HttpRequest,
-    query_params: List[tuple],
-    clean_names: Dict[str, str]
-) -> Q:
-    """
-    Build a query based on the query parameters.
-
-    Arguments:
-    - request (HttpRequest): the HTTP request
-    - query_params (List[tuple]): list of (field, values) tuples
-    - clean_names (Dict[str, str]): mapping of clean names to original names
-
-    Returns:
-    - (Q): the query
-    """
-    query = Q()
-    toggle_fields = {'trips_id', 'gwips_id', 'ribocrypt_id', 'FASTA_file', 'verified'}
-    for field, values in query_params:
-        if field in ('page', 'csrfmiddlewaretoken'):
-            continue
-
-        options = request.GET.getlist(field)
-        if not options:
-            continue
-
-        cn = {v: k for k, v in clean_names.items()}
-        original_field = cn[field]
-
-        if field in toggle_fields:
-            query &= Q(**{original_field: 'on' in options})
-        else:
-            query &= Q(**{f"{original_field}__in": options})
-    return query
-
-
 def handle_filter(
         param_options: dict,
         appropriate_fields: list,
@@ -204,443 +215,290 @@ def handle_filter(
     return clean_results_dict
 
 
-def build_run_query(run_list: list) -> Q:
-    '''
-    For a given run list return a query to filter the Sample model.
-
-    Arguments:
-    - run_list (list): the list of runs to filter
-
-    Returns:
-    - (Q): the query
-    '''
-    query = Q()
-    for run in run_list:
-        query |= Q(Run=run)
-
-    return query
-
-
-def build_bioproject_query(run_list: list) -> Q:
+def trips_panel(trips) -> list:
     '''
-    For a given run list return a query to filter the Sample model.
+    Return the Trips-Viz panel of the links page: one entry per organism and
+    transcriptome of the given Trips rows, linking all of their files. The
+    rows are read grouped in one query.
 
     Arguments:
-    - run_list (list): the list of runs to filter
+    - trips (QuerySet): the Trips rows of the selection
 
     Returns:
-    - (Q): the query
+    - (list): the panel entries (list of dicts)
     '''
-    query = Q()
-    for run in run_list:
-        query |= Q(BioProject=run)
-
-    return query
-
-
-def handle_trips_urls(query: Q) -> list:
+    rows = trips.order_by('organism', 'transcriptome', 'id').values_list(
+        'organism', 'transcriptome', 'Trips_id')
+    panel = []
+    for (organism, transcriptome), group in groupby(rows, itemgetter(0, 1)):
+        # Trips ids are stored as floats (eg. '101.0')
+        file_ids = [trips_id[:-2] for _, _, trips_id in group]
+        panel.append({
+            'clean_organism': f"{organism.replace('_', ' ').capitalize()} - {transcriptome}",
+            'organism': organism,
+            'transcriptome': transcriptome,
+            'files': 'files=' + ','.join(file_ids),
+        })
+    if not panel:
+        panel.append({
+            'clean_organism': 'None of the Selected Runs are available on Trips-Viz',
+            'organism': 'None of the Selected Runs are available on Trips-Viz',
+        })
+    return panel
+
+
+def gwips_panel(samples, gwips) -> list:
     '''
-    For a given query return the required information to link
-    those sample in trips.
+    Return the GWIPS-viz panel of the links page: one entry per organism,
+    genome and BioProject of the given GWIPS rows. A BioProject links its
+    initiation track if some of the selected samples have an initiation
+    inhibitor and its elongation track if some have not.
 
-    Arguments:
-    - query (Q): the query
-
-    Returns:
-    - (list): the required information to link those samples in trips
-    '''
-    trips = []
-    trips_entries = Trips.objects.filter(query)
-
-    trips_df = pd.DataFrame(list(trips_entries.values()))
-    if trips_df.empty:
-        trips.append(
-            {
-                'clean_organism': 'None of the Selected Runs are available on Trips-Viz',
-                'organism': 'None of the Selected Runs are available on Trips-Viz',
-            }
-        )
-    else:
-        for transcriptome in trips_df['transcriptome'].unique():
-            organism_df = trips_df[trips_df['transcriptome'] == transcriptome]
-            file_ids = [str(int(float(i))) for i in organism_df[
-                'Trips_id'
-                ].unique().tolist()]
-            trips.append(
-                {
-                    'clean_organism': organism_df[
-                        'organism'
-                        ].unique()[0].replace('_', ' ').capitalize(),
-                    'organism': organism_df['organism'].unique()[0],
-                    'transcriptome': transcriptome,
-                    'files': f"files={','.join(file_ids)}",
-                }
-            )
-
-    return trips
-
-
-def handle_gwips_urls(request: HttpRequest, query=None) -> list:
-    '''
-    For a given query return the required information to link those sample in GWIPS-viz.
+    The GWIPS rows are read in one query, the inhibitors of their samples
+    being checked with EXISTS subqueries.
 
     Arguments:
-    - request (HttpRequest): the HTTP request for the page
+    - samples (QuerySet): the selected samples
+    - gwips (QuerySet): the GWIPS rows of their BioProjects
 
     Returns:
-    - (list): the required information to link those samples in GWIPS-viz (list of dicts)
+    - (list): the panel entries (list of dicts)
     '''
-    gwips = []
-    requested = dict(request.GET.lists())
-    if str(query) != '<Q: (AND: )>' and query is not None:
-        samples = Sample.objects.filter(query)
-    elif 'run' in requested:
-        runs = requested['run']
-        samples = Sample.objects.filter(build_run_query(runs))
-    elif 'bioproject' in requested:
-        bioprojects = requested['bioproject']
-        samples = Sample.objects.filter(BioProject__in=bioprojects)
-
-    samples_df = pd.DataFrame(list(samples.values()))
-
-    organisms = samples_df['ScientificName'].unique()
-    if 'run' in requested:
-        for organism in organisms:
-            organism_df = samples_df[samples_df['ScientificName'] == organism]
-            gwips_dict = {
-                'clean_organism': organism.replace('_', ' ').capitalize(),
-                'bioprojects': '',
-                'files': '',
-                'gwipsDB': '',
-            }
-            for idx, row in organism_df.iterrows():
-                gwips_entry = GWIPS.objects.filter(BioProject=row['BioProject_id'])
-                if gwips_entry:
-                    gwips_df = pd.DataFrame(list(gwips_entry.values()))
-                    if row['BioProject_id'] not in gwips_dict['bioprojects']:
-                        gwips_dict['bioprojects'] += f"{row['BioProject_id']}, "
-                    gwips_dict['gwipsDB'] = gwips_df['gwips_db'].unique()[0]
-
-                    if any(map(row['INHIBITOR'].__contains__, ['ltm', 'LTM', 'Lac', 'LAC', 'harr', 'Harr', 'HARR'])):
-                        suffix = gwips_df['GWIPS_Init_Suffix'].unique()[0]
-                    else:
-                        suffix = gwips_df['GWIPS_Elong_Suffix'].unique()[0]
-
-                    if gwips_dict['files'] != '' and f"{suffix}=full" not in gwips_dict['files']:
-                        gwips_dict['files'].append(f"{suffix}=full")
-                    elif f"{suffix}=full" not in gwips_dict['files']:
-                        gwips_dict['files'] = [f"{suffix}=full"]
-            gwips_dict['files'] = '&'.join(gwips_dict['files'])
-
-            gwips.append(gwips_dict)
-
-    elif 'bioproject' in requested or str(query) != '<Q: (AND: )>':
-        for organism in organisms:
-            organism_df = samples_df[samples_df['ScientificName'] == organism]
-            organism_df = organism_df[organism_df['gwips_id'] == True]
-            if organism_df.empty:
-                continue
-            gwips_dict = None
-            for bioproject in organism_df['BioProject_id'].unique():
-                gwips_entry = GWIPS.objects.filter(BioProject=bioproject)
-                if gwips_entry:
-                    gwips_df = pd.DataFrame(list(gwips_entry.values()))
-                    if gwips_df['Organism'].unique()[0] != organism:
-                        continue
-                    if not gwips_dict:
-                        gwips_dict = {
-                            'bioproject': bioproject,
-                            'clean_organism': organism.replace('_', ' ').capitalize(),
-                            'gwipsDB': gwips_df['gwips_db'].unique()[0],
-                            'files': [],
-                        }
-                    for col in ['GWIPS_Elong_Suffix', 'GWIPS_Init_Suffix']:
-                        if gwips_df[col].unique()[0] != '':
-                            if f"{gwips_df[col].unique()[0]}=full" not in gwips_dict['files']:
-                                gwips_dict['files'].append(f"{gwips_df[col].unique()[0]}=full")
-
-            if gwips_dict:
-                gwips_dict['files'] = '&'.join(gwips_dict['files'])
-                gwips.append(gwips_dict)
-        else:
-            gwips.append(
-                {
-                    'clean_organism': 'None of the Selected Runs are available on GWIPS-Viz',
-                    'organism': 'None of the Selected Runs are available on GWIPS-Viz',
-                }
-            )
-    else:
-        gwips.append(
-            {
-                'clean_organism': 'None of the Selected Runs are available on GWIPS-Viz',
-                'organism': 'None of the Selected Runs are available on GWIPS-Viz',
-            }
-        )
-    
-    if len(gwips) == 1 and 'gwipsDB' in gwips[0]:
-        if gwips[0]['gwipsDB'] == "":
-            gwips = [
-                {
-                    'clean_organism': 'None of the Selected Runs are available on GWIPS-Viz',
-                    'organism': 'None of the Selected Runs are available on GWIPS-Viz',
-                }
-            ]
-    return gwips
-
-
-def handle_ribocrypt_urls(request: HttpRequest, query=None) -> list:
+    project_samples = samples.filter(BioProject=OuterRef('BioProject'))
+    initiation = Q(INHIBITOR__iregex=INITIATION_PATTERN)
+    rows = gwips.annotate(
+        initiation=Exists(project_samples.filter(initiation)),
+        elongation=Exists(project_samples.exclude(initiation)),
+    ).order_by('Organism', 'gwips_db', 'BioProject', 'id').values_list(
+        'Organism', 'gwips_db', 'BioProject',
+        'GWIPS_Init_Suffix', 'GWIPS_Elong_Suffix', 'initiation', 'elongation')
+    panel = []
+    for (organism, gwips_db, bioproject), group in groupby(
+            rows, itemgetter(0, 1, 2)):
+        group = list(group)
+        files = [f"{row[3]}=full" for row in group if row[5]]
+        files += [f"{row[4]}=full" for row in group if row[6]]
+        if files:
+            panel.append({
+                'clean_organism': organism,
+                'bioproject': bioproject,
+                'gwipsDB': gwips_db,
+                'files': '&'.join(files),
+            })
+    if not panel:
+        panel.append({
+            'clean_organism': 'None of the Selected Runs are available on GWIPS-Viz',
+            'organism': 'None of the Selected Runs are available on GWIPS-Viz',
+            'gwips_db': "",
+            'files': "",
+        })
+    return panel
+
+
+# Initiation inhibitors, matched anywhere in the INHIBITOR field without
+# regard to case (eg. 'Ltm', 'lactimidomycin', 'Harringtonine')
+INITIATION_INHIBITORS = ['LTM', 'LAC', 'HARR']
+INITIATION_PATTERN = '|'.join(map(re.escape, INITIATION_INHIBITORS))
+INITIATION_REGEX = re.compile(INITIATION_PATTERN, re.IGNORECASE)
+
+
+def _unique(values) -> list:
+    return list(dict.fromkeys(values))
+
+
+def _trips_urls(trips_rows: list) -> dict:
     '''
-    For a given query return the required information to link those sample in ribocrypt.
-
-    RiboCrypt samples can only be accessed within projects. Therefore, the BioProject information is required to access the samples.
-    If just a bioproject is provided in the query then use all
-
-    Arguments:
-    - request (HttpRequest): the HTTP request for the page
-    - query (Q): the query
-
-    Returns:
-    - (list): the required information to link those samples in ribocrypt (list of dicts)
+    Trips-Viz link for the first transcriptome of the given Trips rows.
     '''
-    ribocrypt = []
-
-    requested = dict(request.GET.lists())
-
-    if str(query) != '<Q: (AND: )>' and query is not None:
-        samples = RiboCrypt.objects.filter(query)
-
-    elif 'run' in requested:
-        runs = requested['run']
-        samples = RiboCrypt.objects.filter(Run__in=runs)
-    elif 'bioproject' in requested:
-        bioprojects = requested['bioproject']
-        samples = RiboCrypt.objects.filter(BioProject__in=bioprojects)
-
-    if samples:
-        samples_df = pd.DataFrame(list(samples.values()), columns=['BioProject', 'Organism', 'ribocrypt_id', 'Run'])
-        samples_df = samples_df.groupby(['ribocrypt_id', 'Organism'])
-
-        for (ribocrypt_id, organism), df in samples_df:
-            ribocrypt_dict = {
-                'dff': f"{ribocrypt_id}-{organism.replace(' ', '_').lower()}",
-                'clean_organism': f"{organism.replace('_', ' ').capitalize()} - {ribocrypt_id}",
-                'files': ','.join(df['Run'].unique()),
-            }
-            ribocrypt.append(ribocrypt_dict)
-    else:
-        ribocrypt.append(
-            {
-                'clean_organism': 'None of the Selected Runs are available on RiboCrypt',
-                'organism': 'None of the Selected Runs are available on RiboCrypt',
-            }
-        )
-    return ribocrypt
+    if not trips_rows:
+        return {'trips_link': "https://trips.ucc.ie/", 'trips_name': ""}
+    transcriptome = trips_rows[0].transcriptome
+    rows = [row for row in trips_rows if row.transcriptome == transcriptome]
+    file_ids = _unique(str(int(float(row.Trips_id))) for row in rows)
+    return {
+        'trips_link': f"https://trips.ucc.ie/{rows[0].organism}/{transcriptome}/interactive_plot/?files={','.join(file_ids)}",
+        'trips_name': 'Visit Trips-Viz',
+    }
 
 
-def handle_urls_for_query(request: HttpRequest, query=None) -> dict:
+def _gwips_urls(samples: list, gwips_rows: dict, by_inhibitor: bool) -> dict:
     '''
-    generate gwips trips and ribocrypt urls for a given query
+    GWIPS-viz link for the first organism of the given samples with a
+    GWIPS track.
 
     Arguments:
-    - request (HttpRequest): the HTTP request for the page
-    - query (Q): the query
-
-    Returns:
-    - (dict): the urls for the query
+    - samples (list): the Sample instances
+    - gwips_rows (dict): the GWIPS rows of each BioProject
+    - by_inhibitor (bool): pick the initiation or elongation track of each
+        sample from its inhibitor (as done for run selections) rather than
+        showing both tracks of samples flagged as on GWIPS-viz
     '''
-    image_template = '''<img src="{% static 'images/{0}' %}" style=" max-height:75px; max-width:75px;">'''
-    if query is not None:
-        trips = handle_trips_urls(query)[0]
-        if len(trips['clean_organism'].split(" ")) > 5:
-            bioproject_trips_link = "https://trips.ucc.ie/"
-            bioproject_trips_name = ""
-        else:
-            bioproject_trips_link = f"https://trips.ucc.ie/{ trips['organism'] }/{ trips['transcriptome'] }/interactive_plot/?{ trips['files']}"
-            bioproject_trips_name = 'Visit Trips-Viz'
-
-        gwips = handle_gwips_urls(request, query=query)[0]
-        if gwips['clean_organism'] == 'None of the Selected Runs are available on GWIPS-Viz':
-            bioproject_gwips_link = "https://gwips.ucc.ie/"
-            bioproject_gwips_name = ""
-        else:
-            bioproject_gwips_link = f"https://gwips.ucc.ie/cgi-bin/hgTracks?db={gwips['gwipsDB']}&{gwips['files']}"
-            bioproject_gwips_name = "Visit GWIPS-viz"
-
-        ribocrypt = handle_ribocrypt_urls(request, query=query)[0]
-        if len(ribocrypt['clean_organism'].split(" ")) > 5:
-            bioproject_ribocrypt_link = "https://ribocrypt.org/"
-            bioproject_ribocrypt_name = ""
+    for organism in _unique(sample.ScientificName for sample in samples):
+        organism_samples = [
+            sample for sample in samples if sample.ScientificName == organism
+        ]
+        gwips_db = ''
+        files: list = []
+        if by_inhibitor:
+            for sample in organism_samples:
+                entries = gwips_rows.get(sample.BioProject_id)
+                if not entries:
+                    continue
+                gwips_db = entries[0].gwips_db
+                if INITIATION_REGEX.search(sample.INHIBITOR):
+                    suffix = entries[0].GWIPS_Init_Suffix
+                else:
+                    suffix = entries[0].GWIPS_Elong_Suffix
+                if f"{suffix}=full" not in files:
+                    files.append(f"{suffix}=full")
+            if not gwips_db:
+                break
         else:
-            bioproject_ribocrypt_link = f"https://ribocrypt.org/?dff={ ribocrypt['dff'] }&library={ ribocrypt['files'] }&go=TRUE&go=TRUE"
-            bioproject_ribocrypt_name = "Visit RiboCrypt"
-        
-        return {
-            'trips_link': bioproject_trips_link,
-            'trips_name': bioproject_trips_name,
-            'gwips_link': bioproject_gwips_link,
-            'gwips_name': bioproject_gwips_name,
-            'ribocrypt_link': bioproject_ribocrypt_link,
-            'ribocrypt_name': bioproject_ribocrypt_name,
-        }
-
-    else:
+            bioprojects = _unique(
+                sample.BioProject_id for sample in organism_samples
+                if sample.gwips_id
+                )
+            for bioproject in bioprojects:
+                entries = gwips_rows.get(bioproject)
+                if not entries or entries[0].Organism != organism:
+                    continue
+                gwips_db = gwips_db or entries[0].gwips_db
+                for suffix in [entries[0].GWIPS_Elong_Suffix,
+                               entries[0].GWIPS_Init_Suffix]:
+                    if suffix != '' and f"{suffix}=full" not in files:
+                        files.append(f"{suffix}=full")
+            if not gwips_db:
+                continue
         return {
-            'trips_link': "https://trips.ucc.ie/",
-            'trips_name': "Not Available",
-            'gwips_link': "https://gwips.ucc.ie/",
-            'gwips_name': "Not Available",
-            'ribocrypt_link': "https://ribocrypt.org/",
-            'ribocrypt_name': "Not Available",
+            'gwips_link': f"https://gwips.ucc.ie/cgi-bin/hgTracks?db={gwips_db}&{'&'.join(files)}",
+            'gwips_name': "Visit GWIPS-viz",
         }
+    return {'gwips_link': "https://gwips.ucc.ie/", 'gwips_name': ""}
 
 
-def check_custom_track(run: str) -> bool:
+def _ribocrypt_urls(ribocrypt_rows: list) -> dict:
     '''
-    Check if the custom track is available for the run
-
-    Arguments:
-    - run (str): the run to check
-
-    Returns:
-    - (bool): whether the custom track is available for the run
+    RiboCrypt link for the first (ribocrypt_id, Organism) group of the
+    given RiboCrypt rows.
     '''
-    print(f"/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg/bigwig/{run[:5]}")
-    return os.path.exists(f"/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg/bigwig/{run[:5]}/{run}.bw")
+    if not ribocrypt_rows:
+        return {'ribocrypt_link': "https://ribocrypt.org/", 'ribocrypt_name': ""}
+    key = min((row.ribocrypt_id, row.Organism) for row in ribocrypt_rows)
+    runs = _unique(
+        row.Run for row in ribocrypt_rows
+        if (row.ribocrypt_id, row.Organism) == key
+        )
+    dff = f"{key[0]}-{key[1].replace(' ', '_').lower()}"
+    return {
+        'ribocrypt_link': f"https://ribocrypt.org/?dff={dff}&library={','.join(runs)}&go=TRUE&go=TRUE",
+        'ribocrypt_name': "Visit RiboCrypt",
+    }
 
 
-def select_all_query(query_string):
+def resolve_viewer_links(
+        samples, bioprojects=(), by_inhibitor: bool = False) -> dict:
     '''
-    Generate a query to select all the samples in the database that were shown in the table
+    Generate the GWIPS-viz, Trips-Viz and RiboCrypt urls of many runs and
+    their BioProjects at once.
+
+    Each run and BioProject links its first Trips-Viz transcriptome,
+    GWIPS-viz organism and RiboCrypt group. The Trips, GWIPS and RiboCrypt
+    tables are read with one query each.
 
     Arguments:
-    - query_string (str): the query string
+    - samples (iterable): the Sample instances to link
+    - bioprojects (iterable): additional BioProjects to link
+    - by_inhibitor (bool): choose GWIPS-viz tracks from the run inhibitors,
+        as done when runs are selected directly ('run' in the request)
 
     Returns:
-    - (Q): the Django Q object to select all the samples in the database that were shown in the table
+    - (dict): urls keyed by run under 'runs' and by BioProject under
+        'projects', each a dict of trips, gwips and ribocrypt links and
+        names
     '''
-    query_string = query_string.replace('+', ' ').replace("run", "Run")
-
-    query_list = [i.split("=") for i in query_string.split('&')]
-
-    query_list = [i for i in query_list if i[0] not in [
-            'page',
-            'csrfmiddlewaretoken',
-            'links',
-            'sample_page',
-            'study_page',
-            ]
-        ]
-    
-    main_query = Q()  # Initialize an empty main query for AND between fields
-    field_queries = {}  # Dictionary to store OR queries for each field
-
-    if query_list:
-        if len(query_list[0]) != 1:
-            query_list = [
-                [
-                    i[0], i[1].replace('on', 'True')
-                    ] if i[1] == 'on' else i for i in query_list
-                ]
-            query_mappings = {
-                i[0]: get_original_name(
-                    i[0], get_clean_names()
-                    ) for i in query_list
+    samples = list(samples)
+    runs = _unique(sample.Run for sample in samples)
+    projects = _unique(
+        [sample.BioProject_id for sample in samples] + list(bioprojects))
+
+    def group(rows, attribute):
+        grouped: dict = {}
+        for row in rows:
+            grouped.setdefault(getattr(row, attribute), []).append(row)
+        return grouped
+
+    trips_rows = list(Trips.objects.filter(
+        Q(Run__in=runs) | Q(BioProject__in=projects)).order_by('id'))
+    ribocrypt_rows = list(RiboCrypt.objects.filter(
+        Q(Run__in=runs) | Q(BioProject__in=projects)).order_by('id'))
+    gwips_rows = group(
+        GWIPS.objects.filter(BioProject__in=projects).order_by('id'),
+        'BioProject')
+
+    selections = {
+        'runs': (runs, 'Run', 'Run'),
+        'projects': (projects, 'BioProject', 'BioProject_id'),
+    }
+    links: dict = {}
+    for name, (keys, attribute, sample_attribute) in selections.items():
+        trips = group(trips_rows, attribute)
+        ribocrypt = group(ribocrypt_rows, attribute)
+        selected_samples = group(samples, sample_attribute)
+        links[name] = {
+            key: {
+                **_trips_urls(trips.get(key, [])),
+                **_gwips_urls(
+                    selected_samples.get(key, []), gwips_rows, by_inhibitor),
+                **_ribocrypt_urls(ribocrypt.get(key, [])),
             }
-
-            for model_key, value in query_list:
-                if model_key in ['query']:
-                    continue
-
-                field_name = query_mappings[model_key]
-
-                # If the field already exists in field_queries, add to its OR query
-                if field_name in field_queries:
-                    field_queries[field_name] |= Q(**{field_name: value})
-                else:
-                    # If it's a new field, create a new OR query
-                    field_queries[field_name] = Q(**{field_name: value})
-
-    # Combine all field queries with AND
-    for field_query in field_queries.values():
-        main_query &= field_query
-
-    return main_query
+            for key in keys
+        }
+    return links
 
 
-def get_fastp_report_link(run: str, base_path="/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg/fastp"):
+def file_md5(path: str, block_size: int = 1024 * 1024) -> str:
     '''
-    Return path to fastp report file for given run
-
-
-    Arguments:
-    - run (str): the run to get the report for
-
-    Returns:
-    - (str): the path to the report file
+    Return the MD5 checksum of a file, reading it in blocks.
     '''
-    path = f"{base_path}/{run[:6]}/{run}.html"
-    if os.path.exists(path):
-
-        return '/'.join(path.split('/')[-3:])
-    else:
-        path = f"{base_path}/{run[:6]}/{run}_1.html"
-        if os.path.exists(path):
-            return '/'.join(path.split('/')[-3:])
-        else:
-            path = f"{base_path}/{run[:6]}/{run}_2.html"
-            if os.path.exists(path):
-                return '/'.join(path.split('/')[-3:])
-            else:
-                return None
+    digest = hashlib.md5()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
 
-def get_fastqc_report_link(run: str, base_path="/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg/fastqc"):
+class Echo:
     '''
-    Return path to fastp report file for given run
-
-
-    Arguments:
-    - run (str): the run to get the report for
-
-    Returns:
-    - (str): the path to the report file
+    File-like object returning what is written to it, so csv.writer can
+    produce the lines of a streamed response.
     '''
-    path = f"{base_path}/{run[:6]}/{run}_fastqc.html"
-    if os.path.exists(path):
-        return '/'.join(path.split('/')[-3:])
-    else:
-        path = f"{base_path}/{run[:6]}/{run}_1_fastqc.html"
-        if os.path.exists(path):
-            return '/'.join(path.split('/')[-3:])
-        else:
-            path = f"{base_path}/{run[:6]}/{run}_2_fastqc.html"
-            if os.path.exists(path):
-                return '/'.join(path.split('/')[-3:])
-            else:
-                return None
+    def write(self, value):
+        return value
 
 
-def get_ribometric_report_link(run: str, base_path="/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg/ribometric"):
+def keyset_iterator(queryset, fields: list, chunk_size: int = 2000) -> Iterator[tuple]:
     '''
-    Return path to fastp report file for given run
-
+    Yield the values of fields for every row of a queryset, reading chunks
+    ordered by id and starting each chunk after the last id seen. Unlike
+    OFFSET paging every chunk is an index range scan, so reading the whole
+    table is linear in its size.
 
     Arguments:
-    - run (str): the run to get the report for
+    - queryset (QuerySet): the rows to read
+    - fields (list): the fields to return for each row
+    - chunk_size (int): the number of rows fetched per query
 
     Returns:
-    - (str): the path to the report file
+    - (Iterator[tuple]): the field values of each row, in id order
     '''
-    path = f"{base_path}/{run[:6]}/{run}bamtrans_RiboMetric.html"
-    if os.path.exists(path):
-        return '/'.join(path.split('/')[-3:])
-    else:
-        path = f"{base_path}/{run[:6]}/{run}_1bamtrans_RiboMetric.html"
-        if os.path.exists(path):
-            return '/'.join(path.split('/')[-3:])
-        else:
-            path = f"{base_path}/{run[:6]}/{run}_2bamtrans_RiboMetric.html"
-            if os.path.exists(path):
-                return '/'.join(path.split('/')[-3:])
-            else:
-                return None
\ No newline at end of file
+    last_id = None
+    while True:
+        chunk = queryset.order_by('id')
+        if last_id is not None:
+            chunk = chunk.filter(id__gt=last_id)
+        chunk = list(chunk.values_list('id', *fields)[:chunk_size])
+        if not chunk:
+            return
+        for row in chunk:
+            yield row[1:]
+        last_id = chunk[-1][0]
@@ -0,0 +1,187 @@
+from typing import Iterable, Optional
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Sample, Study, ViewerLink
+from .utilities import resolve_viewer_links
+
+LINK_FIELDS = [
+    'trips_link',
+    'trips_name',
+    'gwips_link',
+    'gwips_name',
+    'ribocrypt_link',
+    'ribocrypt_name',
+]
+
+# Models whose rows change the viewer links
+LINKED_MODELS = ['Sample', 'Study', 'Trips', 'GWIPS', 'RiboCrypt']
+
+
+def _link_rows(samples: list, projects: list) -> list:
+    '''
+    Build the ViewerLink rows of the given samples and BioProjects.
+    '''
+    links = resolve_viewer_links(samples, projects)
+    run_links = resolve_viewer_links(samples, projects, by_inhibitor=True)
+
+    def row(bioproject, run, urls, run_urls):
+        return ViewerLink(
+            BioProject=bioproject,
+            Run=run,
+            gwips_run_link=run_urls['gwips_link'],
+            gwips_run_name=run_urls['gwips_name'],
+            **urls,
+        )
+
+    rows = {}
+    for sample in samples:
+        if sample.BioProject_id is None:
+            continue
+        rows[(sample.BioProject_id, sample.Run)] = row(
+            sample.BioProject_id, sample.Run,
+            links['runs'][sample.Run], run_links['runs'][sample.Run])
+    for project in projects:
+        rows[(project, '')] = row(
+            project, '',
+            links['projects'][project], run_links['projects'][project])
+    return list(rows.values())
+
+
+def refresh_viewer_links(bioprojects: Optional[Iterable[str]] = None) -> int:
+    '''
+    Recompute the ViewerLink rows of some or all BioProjects and their runs.
+
+    Arguments:
+    - bioprojects (iterable): the BioProjects to refresh, all if None
+
+    Returns:
+    - (int): the number of rows written
+    '''
+    samples = Sample.objects.only(
+        'Run', 'BioProject', 'ScientificName', 'INHIBITOR', 'gwips_id')
+    if bioprojects is None:
+        projects = list(Study.objects.values_list('BioProject', flat=True))
+    else:
+        projects = list(dict.fromkeys(bioprojects))
+        samples = samples.filter(BioProject__in=projects)
+    samples = list(samples.order_by('id'))
+    projects = list(dict.fromkeys(
+        projects + [s.BioProject_id for s in samples if s.BioProject_id]))
+
+    rows = _link_rows(samples, projects)
+    with transaction.atomic():
+        stale = ViewerLink.objects.all()
+        if bioprojects is not None:
+            stale = stale.filter(BioProject__in=projects)
+        stale.delete()
+        ViewerLink.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _pending_changes() -> dict:
+    # Kept on the connection, like the value sets of membership.py, so that
+    # each thread only sees and refreshes its own changes
+    if not hasattr(connection, 'pending_links'):
+        connection.pending_links = {'projects': set(), 'runs': set()}
+    return connection.pending_links
+
+
+def refresh_pending_links(**kwargs) -> None:
+    '''
+    Refresh the links of the BioProjects changed since the last refresh on
+    this connection, including the BioProjects of changed runs. Run when a
+    transaction commits and, as a signal handler, when a request finishes.
+    '''
+    pending = _pending_changes()
+    projects, runs = pending['projects'], pending['runs']
+    if not projects and not runs:
+        return
+    connection.pending_links = {'projects': set(), 'runs': set()}
+    if runs:
+        projects.update(
+            Sample.objects.filter(Run__in=runs, BioProject__isnull=False)
+            .values_list('BioProject', flat=True)
+            )
+    if projects:
+        refresh_viewer_links(projects)
+
+
+def mark_links_changed(sender, instance, **kwargs) -> None:
+    '''
+    Signal handler recording the BioProject and run of a changed row.
+
+    Changes made in a transaction are refreshed once it commits, so loading
+    a fixture recomputes each changed BioProject once. Autocommit changes
+    are refreshed when the request finishes rather than on every save;
+    scripts saving rows one by one should call refresh_pending_links (or
+    the refresh_viewer_links command) when done.
+    '''
+    pending = _pending_changes()
+    bioproject = getattr(instance, 'BioProject_id', None) \
+        or getattr(instance, 'BioProject', None)
+    if bioproject:
+        pending['projects'].add(str(bioproject))
+    run = getattr(instance, 'Run', None)
+    if run:
+        pending['runs'].add(run)
+    if not connection.in_atomic_block:
+        return
+    callbacks = [entry[1] for entry in connection.run_on_commit]
+    if refresh_pending_links not in callbacks:
+        transaction.on_commit(refresh_pending_links)
+
+
+def viewer_links(samples, bioprojects=(), by_inhibitor: bool = False
+                 ) -> dict:
+    '''
+    Look up the viewer links of many runs and BioProjects, in the format
+    returned by resolve_viewer_links.
+
+    Links are read from the ViewerLink table with one query; any run or
+    BioProject missing from it (eg. before the table has been filled) is
+    resolved from the viewer tables instead.
+
+    Arguments:
+    - samples (iterable): the Sample instances to link
+    - bioprojects (iterable): additional BioProjects to link
+    - by_inhibitor (bool): choose GWIPS-viz tracks from the run inhibitors
+
+    Returns:
+    - (dict): urls keyed by run under 'runs' and by BioProject under
+        'projects'
+    '''
+    samples = list(samples)
+    runs = list(dict.fromkeys(sample.Run for sample in samples))
+    projects = list(dict.fromkeys(
+        [sample.BioProject_id for sample in samples] + list(bioprojects)))
+
+    gwips_fields = ['gwips_run_link', 'gwips_run_name'] if by_inhibitor \
+        else ['gwips_link', 'gwips_name']
+    rows = ViewerLink.objects.filter(
+        Q(Run__in=runs) | Q(Run='', BioProject__in=projects)
+        ).values_list('BioProject', 'Run', *LINK_FIELDS, *gwips_fields)
+
+    links: dict = {'runs': {}, 'projects': {}}
+    for bioproject, run, *values in rows:
+        urls = dict(zip(LINK_FIELDS, values))
+        urls['gwips_link'], urls['gwips_name'] = values[-2:]
+        if run:
+            links['runs'].setdefault(run, urls)
+        else:
+            links['projects'][bioproject] = urls
+
+    missing_runs = [run for run in runs if run not in links['runs']]
+    missing_projects = [
+        project for project in projects if project not in links['projects']
+    ]
+    if missing_runs or missing_projects:
+        resolved = resolve_viewer_links(
+            [sample for sample in samples if sample.Run in missing_runs],
+            missing_projects,
+            by_inhibitor,
+            )
+        links['runs'].update(resolved['runs'])
+        links['projects'].update(resolved['projects'])
+    return links
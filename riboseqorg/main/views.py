@@ -1,9 +1,4 @@
-import csv
-import mimetypes
-import os
-import random
-import re
-import uuid
+import gzip
 from datetime import datetime
 from functools import reduce
 from operator import or_
@@ -11,41 +6,71 @@ from typing import List, Type, Union
 
 from urllib.parse import urlparse, parse_qs
 
-import pandas as pd
 from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.db.models import CharField, Count, F, Q, Value
 from django.db.models.functions import Concat, Length
 from django.db.models.query import QuerySet
-from django.http import HttpRequest, HttpResponse, HttpResponseNotFound
-from django.shortcuts import get_object_or_404, loader, render
+from django.http import (HttpRequest, HttpResponse, HttpResponseBadRequest,
+                         HttpResponseNotFound, StreamingHttpResponse)
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.views import View
+from django.views.decorators.http import condition
 from django_filters.views import FilterView
 from rest_framework import filters, generics
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
+from .bitmap_index import get_sample_index, get_study_index
+from .downloads import (DOWNLOAD_MODES, download_file_types,
+                        manifest_artifacts, manifest_chunks, manifest_name)
+from .exports import (COLUMNAR_FORMATS, EXPORT_FORMATS, columnar_available,
+                      delimited_lines, gzip_stream, ndjson_lines,
+                      rows_to_table, sample_records, table_to_bytes)
+from .facets import parse_selection
+from .field_registry import get_model_fields
+from .filter_compiler import (TOGGLE_FIELDS, compile_filter, filter_spec,
+                              querystring_spec)
 from .filters import StudyFilter
 from .forms import SearchForm
-from .models import GWIPS, Sample, Study, Trips
+from .membership import in_values
+from .models import (GWIPS, Sample, Study, Trips, get_artifact_links,
+                     prefetch_artifact_links)
+from .page_cache import (CountedPaginator, cached_fragment, cached_stream,
+                         fragment_stats, paginate_ids, version_tag)
+from .pagination import SampleCursorPagination
+from .pivot import (MAX_PIVOT_DIMENSIONS, SNAPSHOT_FORMATS,
+                    SNAPSHOT_IMMUTABLE_AGE, SNAPSHOT_MAX_AGE, pivot_counts,
+                    pivot_dimensions, pivot_snapshot)
+from .references import get_reference_catalogue
+from .renderers import (ArrowRenderer, NDJSONRenderer, ParquetRenderer,
+                        TSVGzipRenderer)
+from .search import SearchResults, fts_available
 from .serializers import SampleSerializer
-from .utilities import (build_bioproject_query, build_query, build_run_query,
-                        get_clean_names, get_fastp_report_link,
-                        get_fastqc_report_link, get_original_name,
-                        get_ribometric_report_link, handle_filter,
-                        handle_gwips_urls, handle_ribocrypt_urls,
-                        handle_trips_urls, handle_urls_for_query,
-                        select_all_query)
+from .utilities import (get_clean_names, gwips_panel, keyset_iterator,
+                        trips_panel)
+from .viewer_links import viewer_links
 
 CharField.register_lookup(Length, 'length')
 
 
 class SampleListView(generics.ListCreateAPIView):
     serializer_class = SampleSerializer
+    renderer_classes = [
+        *api_settings.DEFAULT_RENDERER_CLASSES,
+        TSVGzipRenderer,
+        NDJSONRenderer,
+        *([ParquetRenderer, ArrowRenderer] if columnar_available() else []),
+    ]
     filterset_fields = ['Run']
     filter_backends = [filters.OrderingFilter, filters.SearchFilter]
     ordering_fields = ['Run']
     search_fields = ['Run']
+    pagination_class = SampleCursorPagination
     default_limit = 100  # Set a default limit if not provided
 
     default_fields = [
@@ -68,53 +93,121 @@ class SampleListView(generics.ListCreateAPIView):
         'bigwig_reverse_link',
     ]
 
-    def build_query(self, query_params):
+    def get_requested_fields(self) -> list:
         '''
-        Dynamically parse remaining entries and apply filters
-        if the key matches a field
+        Return the valid fields named by the fields parameter, in the order
+        given, or the default fields.
         '''
-        query = Q()
-        for key, values in query_params.lists():
-            key_query = Q()
-            if key not in ['fields', 'limit']:
-                # Check if the key is a valid field in the model
-                if key in [field.name for field in Sample._meta.get_fields()]:
-                    for value in values:
-                        key_query |= Q(**{key: value})
-                    query &= key_query
-        return query
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return self.default_fields
+        model_fields = get_model_fields(Sample)
+        valid_fields = [
+            field for field in dict.fromkeys(fields.split(','))
+            if field in model_fields or field in self.added_fields
+        ]
+        return valid_fields or self.default_fields
+
+    def get_serializer(self, *args, **kwargs):
+        # The selected fields are passed per request; writes use them all
+        if 'data' not in kwargs:
+            fields = self.get_requested_fields()
+            kwargs['fields'] = fields
+            if args and any(field in self.added_fields for field in fields):
+                args = (prefetch_artifact_links(args[0]), *args[1:])
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'ndjson':
+            return super().list(request, *args, **kwargs)
+        # NDJSON is streamed from value tuples as rows are fetched, without
+        # model instances or serializer fields
+        return StreamingHttpResponse(
+            ndjson_lines(sample_records(
+                self.filter_queryset(self.get_queryset()),
+                self.get_requested_fields())),
+            content_type=NDJSONRenderer.media_type,
+            )
+
+    def filter_queryset(self, queryset):
+        # Search and ordering apply before the limit. Cursor pages walk
+        # every match rather than taking the first limit
+        queryset = super().filter_queryset(queryset)
+        if self.paginator.is_requested(self.request):
+            return queryset
+        limit = self.request.query_params.get('limit', self.default_limit)
+        return queryset[:int(limit)]
 
     def get_queryset(self):
         # Get query parameters
-        fields = self.request.query_params.get('fields')
         limit = self.request.query_params.get('limit', self.default_limit)
-
-        # Start with an empty query
-        query = Q()
-        query = self.build_query(self.request.query_params)
-        queryset = Sample.objects.filter(query)
-        # Subset fields to just take selected
-        if fields:
-            requested_fields = set(fields.split(','))
-
-            valid_fields = [
-                field for field in requested_fields
-                if field in [f.name for f in Sample._meta.get_fields()] or
-                field in self.added_fields
-            ]
-            if valid_fields:
-                self.serializer_class.Meta.fields = valid_fields
+        params = self.request.query_params
+
+        # The bitmap index can take the first limit matches itself, unless
+        # they are paginated, searched or reordered afterwards
+        presliced = not (
+            self.paginator.is_requested(self.request)
+            or params.get(api_settings.SEARCH_PARAM)
+            or params.get(api_settings.ORDERING_PARAM))
+
+        # Parameters naming a Sample field filter on it; filters on indexed
+        # fields are answered by the bitmap index
+        selection = filter_spec(params.lists())
+        index = get_sample_index()
+        if presliced and selection and all(
+                key in index.fields for key in selection):
+            ids = index.match(selection)[:int(limit)]
+            queryset = Sample.objects.filter(pk__in=ids.tolist())
         else:
-            self.serializer_class.Meta.fields = self.default_fields
+            queryset = Sample.objects.filter(compile_filter(selection))
 
-        return queryset[:int(limit)]
+        # Only load the columns that are serialised (the links need Run)
+        fields = self.get_requested_fields()
+        columns = [field for field in fields if field not in self.added_fields]
+        if len(columns) < len(fields):
+            columns.append('Run')
+        return queryset.only(*columns)
 
 
 class SampleFieldsView(APIView):
     def get(self, request):
         # Get all field names from the Sample model
-        fields = [field.name for field in Sample._meta.get_fields()]
-        return Response(fields)
+        return Response(list(get_model_fields(Sample).names))
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        # Fragment cache hits and misses of the worker serving the request
+        stats = {
+            'views': {
+                view: {'hits': counts['hits'], 'misses': counts['misses']}
+                for view, counts in fragment_stats.items()
+            },
+        }
+        if hasattr(cache, 'stats'):
+            stats['cache'] = cache.stats()
+        return Response(stats)
+
+
+class PivotView(APIView):
+    def get(self, request):
+        # Sample counts grouped by the requested rows and cols dimensions,
+        # aggregated for the pivot page
+        rows = request.query_params.getlist('rows')
+        cols = request.query_params.getlist('cols')
+        dimensions = rows + cols
+        unknown = [name for name in dimensions if name not in pivot_dimensions()]
+        if unknown:
+            raise ParseError(f"Unknown dimensions: {', '.join(unknown)}")
+        if len(set(dimensions)) != len(dimensions):
+            raise ParseError("Each dimension may only be used once")
+        if len(dimensions) > MAX_PIVOT_DIMENSIONS:
+            raise ParseError(
+                f"At most {MAX_PIVOT_DIMENSIONS} dimensions may be used")
+        spec = filter_spec(request.query_params.lists())
+        return Response(pivot_counts(rows, cols, spec))
 
 
 def index(request: HttpRequest) -> str:
@@ -194,21 +287,25 @@ class SearchView(View):
 
     def get_search_results(
             self, model: Type, query: str, exclude: List
-            ) -> QuerySet:
+            ) -> Union[SearchResults, QuerySet]:
         """
         Get search results based on the query and excluded fields.
 
+        Uses the ranked full-text index when the database has one, falling
+        back to matching every field with icontains.
+
         Arguments:
         - model (Type): The model type.
         - query (str): The search query.
         - exclude (List): The list of fields to exclude.
 
         Returns:
-        - (QuerySet): QuerySet of search results.
+        - (Union[SearchResults, QuerySet]): the search results.
         """
-        field_names: List = [
-            f.name for f in model._meta.get_fields() if f.name not in exclude
-            ]
+        if fts_available(model):
+            return SearchResults(model, query)
+
+        field_names = get_model_fields(model).names_excluding(exclude)
         conditions: Q = reduce(
             or_, [Q(**{f'{field}__icontains': query}) for field in field_names]
             )
@@ -313,69 +410,37 @@ def samples(request: HttpRequest) -> str:
         # "Feeding",
         # "Temperature",
     ]
-    toggle_fields = [
-        'trips_id',
-        'gwips_id',
-        'ribocrypt_id',
-        'FASTA_file',
-        'verified',
-    ]
     clean_names = get_clean_names()
 
-    cache_key = f"samples_view_{request.GET.urlencode()}"
-    cached_result = cache.get(cache_key)
-    if cached_result is not None:
-        return cached_result
+    # Only the filter panel fields and toggles restrict the table
+    selection = parse_selection(request, appropriate_fields + TOGGLE_FIELDS)
 
-    # Get all the query parameters from the request
-    query_params = request.GET.lists()
-    filtered_columns = [
-        get_original_name(name, clean_names)
-        for name, values in request.GET.lists()
-    ]
-    param_options = {}
-    for field in Sample._meta.fields:
-        # if field.get_internal_type() == 'CharField':
-        if field.name in filtered_columns:
-            # update query_params to remove the current field to ensure this
-            # field is not filtered by itself
-            query_params = [
-                i for i in request.GET.lists()
-                if get_original_name(i[0], clean_names) != field.name
-            ]
-            query = build_query(request, query_params, clean_names)
-            sample_entries = Sample.objects.filter(query)
-
-            filtered_samples = sample_entries.values(field.name).annotate(
-                count=Count(field.name)).order_by('-count')
-            param_options[field.name] = filtered_samples
-        else:
-            query_params = request.GET.lists()
-            query = build_query(request, query_params, clean_names)
-            sample_entries = Sample.objects.filter(query)
-
-            values = sample_entries.values(field.name).annotate(
-                count=Count(field.name)).order_by('-count')
-            param_options[field.name] = values
-
-    clean_results_dict = handle_filter(param_options, appropriate_fields,
-                                       clean_names)
-    clean_results_dict.pop('count', None)
-    query_params = []
-    for name, values in request.GET.lists():
-        if get_original_name(name, clean_names) in appropriate_fields or name in toggle_fields:
-            query_params.append((name, values))
-
-    query = build_query(request, query_params, clean_names)
-    # get entries to populate table
-    sample_entries = Sample.objects.filter(query)
-    sample_entries = list(
-        reversed(sample_entries.order_by('INHIBITOR', 'LIBRARYTYPE')))
+    def get_facets():
+        facets = get_sample_index().facet_counts(
+            selection, appropriate_fields)
+        return {
+            clean_names[field]: options
+            for field, options in facets.items() if options
+        }
 
-    # Paginate the studies
-    paginator = Paginator(sample_entries, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # The facets and the number of results are cached separately from the
+    # page, so that paging through a selection reuses them
+    clean_results_dict = cached_fragment(
+        'samples', 'facets', selection, get_facets)
+    count = cached_fragment(
+        'samples', 'count', selection,
+        lambda: get_sample_index().count(selection))
+
+    # Reverse (INHIBITOR, LIBRARYTYPE) order, sorted by the database,
+    # loading only the columns shown in the table
+    sample_entries = Sample.objects.filter(
+        compile_filter(selection)
+        ).order_by('-INHIBITOR', '-LIBRARYTYPE', '-pk').only(
+            'Run', 'BioProject', 'ScientificName', 'LIBRARYTYPE', 'INHIBITOR')
+
+    # Paginate the samples
+    paginator = CountedPaginator(sample_entries, 10, count)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
     context = {
         'page_obj': page_obj,
@@ -386,14 +451,9 @@ def samples(request: HttpRequest) -> str:
         'FASTA_file_toggle_state': request.GET.get('FASTA_file', False),
         'verified_toggle_state': request.GET.get('verified', False),
     }
-    # Render the studies template with the filtered and paginated studies
+    # Render the samples template with the filtered and paginated samples
     # and the filter options
-    response = render(request, 'main/samples.html', context)
-    cache.set(cache_key, response, 60 * 15)  # Cache for 15 minutes
-
-    # Render the studies template with the filtered and paginated studies
-    # and the filter options
-    return response
+    return render(request, 'main/samples.html', context)
 
 
 def studies(request: HttpRequest) -> str:
@@ -408,91 +468,47 @@ def studies(request: HttpRequest) -> str:
     """
     appropriate_fields = [
         'ScientificName',
-        'Organism',
     ]
     boolean_fields = [
         'PMID',
     ]
     clean_names = get_clean_names()
 
-    cache_key = f"studies_view_{request.GET.urlencode()}"
-    cached_result = cache.get(cache_key)
-    if cached_result is not None:
-        return cached_result
-
-    # Get all the query parameters from the request
-    # used for filter panel
-    query_params = [(name, values) for name, values in request.GET.lists()
-                    if name in appropriate_fields or name in boolean_fields]
-    filtered_columns = [
-        get_original_name(name, clean_names)
-        for name, values in request.GET.lists()
-    ]
+    # Boolean fields are selected and indexed by availability
+    selection = parse_selection(
+        request, appropriate_fields + boolean_fields, Study)
 
-    boolean_param_options = {}
-    # Get the unique values and counts for each parameter within the
-    # filtered queryset
-    param_options = {}
-    for field in Study._meta.fields:
-        if field.get_internal_type() == 'CharField':
-            if field.name in filtered_columns:
-                # update query_params to remove the current field to ensure
-                # this field is not filtered by itself
-                query_params = [
-                    i for i in request.GET.lists()
-                    if get_original_name(i[0], clean_names) != field.name
-                ]
-                query_params = [
-                    (name, values) for name, values in request.GET.lists()
-                    if (name in appropriate_fields or name in boolean_fields)
-                    and get_original_name(name, clean_names) != field.name
-                ]
-
-                query = build_query(request, query_params, clean_names)
-                studies = Study.objects.filter(query)
-
-                filtered_studies = studies.values(field.name).annotate(
-                    count=Count(field.name)).order_by('-count')
-                param_options[field.name] = filtered_studies
-            else:
-                query = build_query(request, query_params, clean_names)
-                studies = Study.objects.filter(query)
-
-                values = studies.values(field.name).annotate(
-                    count=Count(field.name)).order_by('-count')
-                param_options[field.name] = values
-
-        if field.name in boolean_fields:
-            query = build_query(request, query_params, clean_names)
-            studies = Study.objects.filter(query)
-            values = studies.values(field.name).annotate(
-                count=Count(field.name)).order_by('-count')
-
-            available = [
-                i for i in values if i[field.name] not in ['', 'nan', None]
-            ]
-            available_count = sum([i['count'] for i in available])
-
-            not_available = [
-                i for i in values if i[field.name] in ['', 'nan', None]
-            ]
-            not_available_count = sum([i['count'] for i in not_available])
-
-            clean_name = clean_names[field.name]
-            boolean_param_options[clean_name] = [{
-                'count': available_count,
+    def get_facets():
+        facets = get_study_index().facet_counts(
+            selection, appropriate_fields + boolean_fields)
+        clean_results_dict = {
+            clean_names[field]: facets[field]
+            for field in appropriate_fields if facets[field]
+        }
+        for field in boolean_fields:
+            counts = {
+                option['value']: option['count'] for option in facets[field]
+            }
+            clean_results_dict[clean_names[field]] = [{
+                'count': counts.get(True, 0),
                 'value': 'Available'
             }, {
-                'count': not_available_count,
+                'count': counts.get(False, 0),
                 'value': 'Not Available'
             }]
+        return clean_results_dict
+
+    def get_ids():
+        # the index holds the keys in BioProject order
+        return get_study_index().match(selection).tolist()
 
-    # rebuild query to populate table
-    query_params = [(name, values) for name, values in request.GET.lists()
-                    if name in appropriate_fields or name in boolean_fields]
-    query = build_query(request, query_params, clean_names)
-    study_entries = Study.objects.filter(query)
-    for i, obj in enumerate(study_entries):
+    clean_results_dict = cached_fragment(
+        'studies', 'facets', selection, get_facets)
+    ids = cached_fragment('studies', 'ids', selection, get_ids)
+
+    # Paginate the studies
+    page_obj = paginate_ids(Study, ids, request.GET.get('page'))
+    for obj in page_obj:
         date_string = obj.Release_Date
         try:
             date_obj = datetime.strptime(date_string,
@@ -502,7 +518,7 @@ def studies(request: HttpRequest) -> str:
             print(obj.BioProject, date_string)
             # NOTE: For error associated dates
             date_obj = "01/01/2001"
-        study_entries[i].Release_Date = date_obj
+        obj.Release_Date = date_obj
 
 
 # study_entries.save()
@@ -512,28 +528,13 @@ def studies(request: HttpRequest) -> str:
     # based on the metadata of the samples it contains. This is not currently
     # implemented
     # sample_filter_options = get_sample_filter_options(study_entries)
-    clean_results_dict = handle_filter(param_options, appropriate_fields,
-                                       clean_names)
-    clean_results_dict = {
-        **clean_results_dict,
-        **boolean_param_options
-    }  # , **sample_filter_options}
-    clean_results_dict.pop('count', None)
 
-    # Paginate the studies
-    paginator = Paginator(study_entries, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    response = render(request, 'main/studies.html', {
+    # Render the studies template with the filtered and paginated studies
+    # and the filter options
+    return render(request, 'main/studies.html', {
         'page_obj': page_obj,
         'param_options': clean_results_dict
     })
-    cache.set(cache_key, response, 60 * 15)  # Cache for 15 minutes
-
-    # Render the studies template with the filtered and paginated studies
-    # and the filter options
-    return response
 
 
 def about(request: HttpRequest) -> str:
@@ -563,20 +564,21 @@ def study_detail(request: HttpRequest, query: str) -> str:
     study_model = get_object_or_404(Study, BioProject=query)
 
     # return all results from Study where Accession=query
-    ls = Sample.objects.filter(BioProject=query)
+    ls = prefetch_artifact_links(Sample.objects.filter(BioProject=query))
 
-    query = Q(BioProject=query)
-    urls = handle_urls_for_query(request, query)
+    # generate GWIPS, Trips and RiboCrypt URLs for the study and each run
+    links = viewer_links(
+        ls, bioprojects=[query], by_inhibitor='run' in request.GET)
+    urls = links['projects'][query]
 
     for entry in ls:
-        query = Q(Run=entry.Run)
-        urls = handle_urls_for_query(request, query)
-        entry.trips_link = urls['trips_link']
-        entry.trips_name = urls['trips_name']
-        entry.gwips_link = urls['gwips_link']
-        entry.gwips_name = urls['gwips_name']
-        entry.ribocrypt_link = urls['ribocrypt_link']
-        entry.ribocrypt_name = urls['ribocrypt_name']
+        entry_urls = links['runs'][entry.Run]
+        entry.trips_link = entry_urls['trips_link']
+        entry.trips_name = entry_urls['trips_name']
+        entry.gwips_link = entry_urls['gwips_link']
+        entry.gwips_name = entry_urls['gwips_name']
+        entry.ribocrypt_link = entry_urls['ribocrypt_link']
+        entry.ribocrypt_name = entry_urls['ribocrypt_name']
 
     # Return all results from Sample and query the sqlite too and add this to
     # the table
@@ -701,19 +703,20 @@ def sample_detail(request: HttpRequest, query: str) -> str:
         if value not in ['nan', '']:
             if key in appropriate_fields:
                 ks.append((clean_names[key], value))
-    sample_query = Q(Run=query)
 
     # check if custom track exists
-    if ls[0].bigwig_forward_link or ls[0].bigwig_reverse_link:
+    if sample_model.bigwig_forward_link or sample_model.bigwig_reverse_link:
         custom_track = "View Custom Track"
     else:
         custom_track = ""
     # generate GWIPS and Trips URLs
-    urls = handle_urls_for_query(request, sample_query)
+    urls = viewer_links(
+        ls, by_inhibitor='run' in request.GET)['runs'][query]
 
     paginator = Paginator(ls, len(ls))
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    prefetch_artifact_links(page_obj)
 
     context = {
         'Sample': sample_model,
@@ -726,8 +729,8 @@ def sample_detail(request: HttpRequest, query: str) -> str:
         'ribocrypt': urls['ribocrypt_link'],
         'ribocrypt_name': urls['ribocrypt_name'],
         'custom_track': custom_track,
-        'fastp': get_fastp_report_link(sample_model.Run),
-        'fastqc': get_fastqc_report_link(sample_model.Run),
+        'fastp': sample_model.fastp_link,
+        'fastqc': sample_model.fastqc_link,
     }
     return render(request, 'main/sample.html', context)
 
@@ -766,72 +769,6 @@ def sample_select_form(request: HttpRequest) -> str:
         return links(request)
 
 
-def generate_link(run, file_type="reads"):
-    """
-    Generate Link for a specific run of a given type (default is reads)
-    Ensure path is valid before returning link
-
-    Arguments:
-    - run (str): the run accession number
-    - type (str): the type of link to generate (default is reads)
-
-    Returns:
-    - (str): the link to the file
-    OR
-    - (None): if the link is not valid
-    """
-    server_base = "/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg"
-    path_suffixes = {
-        "reads": ".collapsed.fa.gz",
-        "counts": "_counts.txt",
-        "bams": ".bam",
-        "adapter_report": ".adapter.fa",
-        "fastp": ".html",
-        "fastqc": "_fastqc.html",
-        "ribometric": "bamtrans_RiboMetric.html",
-        "bigwig (forward)": "_pshifted_forward.bigWig",
-        "bigwig (reverse)": "_pshifted_reverse.bigWig",
-    }
-    path_dirs = {
-        "reads": "collapsed_reads",
-        "counts": "counts",
-        "bams": "bams",
-        "adapter_report": "adapter_reports",
-        "fastp": "fastp",
-        "fastqc": "fastqc",
-        "ribometric": "ribometric",
-        "bigwig (forward)": "bigwig",
-        "bigwig (reverse)": "bigwig",
-    }
-
-    run = str(run)
-    if os.path.exists(
-            os.path.join(server_base, path_dirs[file_type], run[:6],
-                         run + path_suffixes[file_type])):
-        return f"/static2/{path_dirs[file_type]}/{run[:6]}/{run + path_suffixes[file_type]}"
-
-    elif os.path.exists(
-            os.path.join(server_base, path_dirs[file_type], run[:6],
-                         run + "_1" + path_suffixes[file_type])):
-        return f"/static2/{path_dirs[file_type]}/{run[:6]}/{run}_1{path_suffixes[file_type]}"
-
-    return None
-
-
-def check_path_exists(
-        path, server_base="/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg"):
-    """
-    Check if a given path exists
-
-    Arguments:
-    - path (str): the path to check
-
-    Returns:
-    - (bool): True if the path exists, False otherwise
-    """
-    return os.path.exists(server_base + "/" + path)
-
-
 def get_links_sample_entries(selected: dict, request: HttpRequest):
     """
     Get the sample entries for a given links request
@@ -842,34 +779,27 @@ def get_links_sample_entries(selected: dict, request: HttpRequest):
 
     Retruns:    
     - sample_entries: The entries matching the links query
+    - bioproject_query (Q): the BioProjects of the query, to filter the
+        Trips and GWIPS tables
     """
     sample_entries = Sample.objects.all()
 
     # Parse query from request
     if 'query' in selected:
-        print(selected)
         if selected['query'][0]:
-            sample_query = select_all_query(selected['query'][0])
+            sample_query = compile_filter(
+                querystring_spec(selected['query'][0]))
             sample_entries = sample_entries.filter(sample_query)
-            if "PubMed" in selected['query'][0] and "Available" in selected[
-                    'query'][0]:
-                sample_entries = sample_entries.filter(
-                    BioProject__PMID__length__gt=0)
-        bioproject_query = sample_entries.values("BioProject").distinct()
-        # trips = Trips.objects.filter(Run__in=sample_entries)
-        # print(sample_entries)
-        # print(trips)
+        bioproject_query = Q(BioProject__in=sample_entries.values("BioProject"))
 
     elif 'run' in selected:
-        sample_query = selected['run']
-        sample_entries = Sample.objects.filter(Run__in=sample_query)
-        bioproject_query = sample_entries.values("BioProject").distinct()
-        # sample_query = build_run_query(selected['run'])
+        sample_entries = Sample.objects.filter(
+            in_values('Run', selected['run']))
+        bioproject_query = Q(BioProject__in=sample_entries.values("BioProject"))
 
     elif 'bioproject' in selected:
-        bioproject_query = selected['bioproject']
-        sample_entries = Sample.objects.filter(BioProject__in=bioproject_query)
-        # sample_query = build_bioproject_query(selected['bioproject'])
+        bioproject_query = in_values('BioProject', selected['bioproject'])
+        sample_entries = Sample.objects.filter(bioproject_query)
 
     else:
         sample_page_obj = None
@@ -891,117 +821,37 @@ def links(request: HttpRequest) -> str:
     selected = dict(request.GET.lists())
 
     sample_entries, bioproject_query = get_links_sample_entries(selected, request)
-    # generate GWIPS and Trips URLs
-    if sample_entries:
-        # print(sample_query,
-        #       "Anmol"
-        #       )
-        # trips = handle_trips_urls(sample_query)
+
+    def panels():
+        # generate the GWIPS and Trips panels of the whole selection
+        if not sample_entries.exists():
+            return trips_panel(Trips.objects.none()), gwips_panel(
+                sample_entries, GWIPS.objects.none())
         if 'bioproject' in selected:
-            trips_sql = Trips.objects.filter(BioProject__in=bioproject_query)
+            trips_sql = Trips.objects.filter(bioproject_query)
         else:
             trips_sql = Trips.objects.filter(Run__in=sample_entries.values("Run"))
+        return (
+            trips_panel(trips_sql),
+            gwips_panel(sample_entries, GWIPS.objects.filter(bioproject_query)),
+        )
 
-
-        trips = []
-        if trips_sql:
-            trips_sql = pd.DataFrame(list(trips_sql.values()))
-            trips_sql["Trips_id"] = trips_sql["Trips_id"].apply(lambda x:x[:-2])
-            trips_sql = trips_sql.groupby(
-                ["organism","transcriptome"]
-            )["Trips_id"].apply(list).reset_index()
-            for _, trip in trips_sql.iterrows():
-                trips.append({
-                    'clean_organism': f"{trip['organism'].replace('_', ' ').capitalize()} - {trip['transcriptome']}",
-                    'organism': trip['organism'],
-                    'transcriptome': trip['transcriptome'],
-                    'files': 'files='+','.join(trip['Trips_id'])
-                })
-        else:
-            trips.append(
-                {
-                    'clean_organism': 'None of the Selected Runs are available on Trips-Viz',
-                    'organism': 'None of the Selected Runs are available on Trips-Viz',
-                }
-            )
-            
-        
-        # print(trips,"Anmol")
-        gwips_sql = GWIPS.objects.filter(BioProject__in=bioproject_query)
-        gwips = [] 
-        if gwips_sql:
-            inhibited = pd.DataFrame(list(sample_entries.values())).drop_duplicates(
-                subset=['INHIBITOR', 'BioProject_id'], keep='first')
-            noninhibited = inhibited[~inhibited['INHIBITOR'].str.contains(
-                 'LTM|LAC|HARR', flags=re.IGNORECASE
-            )]
-            inhibited = inhibited[inhibited['INHIBITOR'].str.contains(
-                 'LTM|LAC|HARR', flags=re.IGNORECASE
-            )]
-
-            gwips_sql = pd.DataFrame(list(gwips_sql.values()))
-            gwips_sql_a = gwips_sql[gwips_sql["BioProject"].isin(
-
-                inhibited["BioProject_id"].values)]
-            gwips_sql_a["files"] = gwips_sql_a["GWIPS_Init_Suffix"].apply(
-                lambda x: f"{x}=full"
-            )
-
-            gwips_sql_b = gwips_sql[gwips_sql["BioProject"].isin(
-                noninhibited["BioProject_id"].values)]
-
-            gwips_sql_b["files"] = gwips_sql_b["GWIPS_Elong_Suffix"].apply(
-                lambda x: f"{x}=full"
-            )
-
-            gwips_sql = pd.concat([gwips_sql_a, gwips_sql_b]).groupby(["Organism","gwips_db","BioProject"])["files"].apply(list).reset_index()
-            gwips_sql["files"] = gwips_sql["files"].apply(
-                lambda x: "&".join(x)
-            )
-        
-            for _, gwip in gwips_sql.iterrows():
-                gwips.append({
-                'clean_organism': gwip['Organism'],
-                'bioproject': gwip['BioProject'],
-                'gwipsDB': gwip['gwips_db'],
-                'files': gwip['files']
-            })
-        if not gwips: 
-            gwips = [
-                {
-                    'clean_organism': 'None of the Selected Runs are available on GWIPS-Viz',
-                    'organism': 'None of the Selected Runs are available on GWIPS-Viz',
-                    'gwips_db':"",
-                    'files':""
-                }
-            ]
-
-    else:
-        trips = [{
-            'clean_organism':
-            'None of the Selected Runs are available on Trips-Viz',
-            'organism':
-            'None of the Selected Runs are available on Trips-Viz',
-        }]
-        gwips = [{
-            'clean_organism':
-            'None of the Selected Runs are available on GWIPS-Viz',
-            'organism':
-            'None of the Selected Runs are available on GWIPS-Viz',
-        }]
-    # sample_entries = Sample.objects.filter(sample_query)
-
-    # Retrieve entries
+    panel_selection = {
+        name: options for name, options in selected.items() if name != 'page'
+    }
+    trips, gwips = cached_fragment('links', 'panels', panel_selection, panels)
 
     # Paginate
-    paginator = Paginator(sample_entries, 10)
+    paginator = Paginator(sample_entries.order_by('id'), 10)
     page_number = request.GET.get('page')
     sample_page_obj = paginator.get_page(page_number)
+    prefetch_artifact_links(sample_page_obj)
 
     # get links for entries on page
+    page_links = viewer_links(
+        sample_page_obj, by_inhibitor='run' in request.GET)
     for entry in sample_page_obj:
-        query = Q(Run=entry.Run)
-        urls = handle_urls_for_query(request, query)
+        urls = page_links['runs'][entry.Run]
         entry.trips_link = urls['trips_link']
         entry.trips_name = urls['trips_name']
         entry.gwips_link = urls['gwips_link']
@@ -1019,13 +869,46 @@ def links(request: HttpRequest) -> str:
         })
 
 
+def get_csv_queryset(selected: dict) -> Union[QuerySet, None]:
+    '''
+    Return the samples selected for a metadata download, or None if the
+    request selects nothing.
+
+    Arguments:
+    - selected (dict): the params from the query
+
+    Returns:
+    - (QuerySet): the selected samples
+    '''
+    if 'download-metadata' in selected:
+        spec = querystring_spec(selected['download-metadata'][0])
+        if spec:
+            return Sample.objects.filter(compile_filter(spec))
+
+    elif 'run' in selected:
+        return Sample.objects.filter(in_values('Run', selected['run']))
+
+    elif 'bioproject' in selected:
+        return Sample.objects.filter(
+            in_values('BioProject', selected['bioproject']))
+
+    return None
+
+
 def generate_samples_csv(request) -> HttpResponse:
     '''
-    Generate and return a csv file containing the metadata for the samples in
-    the database based on the request, using chunked processing for large queries
+    Generate and return a file containing the metadata for the samples in
+    the database based on the request.
+
+    The format is chosen with the format parameter: csv (default) or
+    tsv.gz are streamed as they are written, reading the samples in chunks
+    ordered by id so memory use does not grow with the selection; parquet
+    and arrow build a columnar file with typed and dictionary encoded
+    columns.
     '''
     selected = dict(request.GET.lists())
-    
+    file_format = request.GET.get('format', 'csv')
+
     exclude_fields = [
         "id",
         "verified",
@@ -1035,184 +918,96 @@ def generate_samples_csv(request) -> HttpResponse:
         "readfile",
     ]
 
-    CHUNK_SIZE = 500
-
-    def process_queryset_in_chunks(base_query, chunk_size):
-        """Process a large queryset in smaller chunks to avoid SQLite limitations"""
-        offset = 0
-        total_processed = 0
-        
-        
-        while True:
-            chunk = base_query.order_by('id')[offset:offset + chunk_size]
-            chunk_data = list(chunk)  # Evaluate the chunk
-            
-            
-            if not chunk_data:
-                break
-                
-            for item in chunk_data:
-                total_processed += 1
-                yield item
-                
-            offset += chunk_size
-            
-
-    def get_initial_query():
-        if 'download-metadata' in selected:
-            sample_query = select_all_query(selected['download-metadata'][0])
-            sample_entries = Sample.objects.filter(sample_query)
-            
-            runs = sample_entries.values_list('Run', flat=True)
-            
-            if not str(sample_query) == "(AND: )":
-                return build_run_query(runs)
-                
-        elif 'run' in selected:
-            print(f"Using run query: {selected['run']}")  # Debug log
-            return build_run_query(selected['run'])
-            
-        elif 'bioproject' in selected:
-            return build_bioproject_query(selected['bioproject'])
-            
-        return None
-
-    sample_query = get_initial_query()
-    
-    if sample_query is not None:
-        base_queryset = Sample.objects.filter(sample_query)
-        
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = 'attachment; filename="RiboSeqOrg_Metadata.csv"'
-
-        fields = [field.name for field in Sample._meta.get_fields() 
-                 if field.name not in exclude_fields]
-
-        writer = csv.writer(response)
-        writer.writerow(fields)  # Write header row
-        
-        rows_written = 0  # Debug counter
-        
-        # Process the queryset in chunks
-        for item in process_queryset_in_chunks(base_queryset, CHUNK_SIZE):
-            row_data = [getattr(item, field) for field in fields 
-                       if field not in exclude_fields]
-            writer.writerow(row_data)
-            rows_written += 1  # Debug counter
-            
-        return response
-    else:
+    if file_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown format: {file_format}")
+    if file_format in COLUMNAR_FORMATS and not columnar_available():
+        return HttpResponseBadRequest(
+            f"The {file_format} format is not available on this server")
+
+    base_queryset = get_csv_queryset(selected)
+    if base_queryset is None:
         return HttpResponseNotFound("No Samples Selected")
 
-def build_run_query(runs):
-    """
-    Build a simplified query for runs
-    """
-    from django.db.models import Q
-    
-    # Convert to list if it's a queryset
-    runs = list(runs)
-    
-    if not runs:
-        return None
-        
-    # Build a single Q object instead of combining multiple
-    query = Q(Run__in=runs)
-    return query
-
-def build_bioproject_query(bioprojects):
-    """
-    Build a simplified query for bioprojects
-    """
-    from django.db.models import Q
-    
-    # Convert to list if it's a queryset
-    bioprojects = list(bioprojects)
-    
-    if not bioprojects:
-        return None
-        
-    # Build a single Q object instead of combining multiple
-    query = Q(Bioproject__in=bioprojects)
-    return query
+    fields = list(get_model_fields(Sample).names_excluding(exclude_fields))
+    rows = keyset_iterator(base_queryset, fields)
+
+    content_type, extension = EXPORT_FORMATS[file_format]
+    if file_format in COLUMNAR_FORMATS:
+        response = HttpResponse(
+            table_to_bytes(rows_to_table(fields, rows), file_format),
+            content_type=content_type,
+            )
+    elif file_format == 'tsv.gz':
+        response = StreamingHttpResponse(
+            gzip_stream(delimited_lines(fields, rows, delimiter='\t')),
+            content_type=content_type,
+            )
+    else:
+        response = StreamingHttpResponse(
+            delimited_lines(fields, rows), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="RiboSeqOrg_Metadata.{extension}"'
+    return response
+
 
 def reports(request, query) -> str:
     '''
-    Generate reports page
+    Generate reports page, with the report links of the run read from the
+    artifact manifest
 
     Arguments:
     - request (HttpRequest): the HTTP request for the page
+    - query (str): the run accession number
 
     Returns:
     - (render): the rendered HTTP response for the page
     '''
-
+    report_links = get_artifact_links([query]).get(query, {})
     return render(
         request, 'main/reports.html', {
-            'fastp': get_fastp_report_link(query),
-            'fastqc': get_fastqc_report_link(query),
-            'ribometric': get_ribometric_report_link(query)
+            'fastp': report_links.get('fastp'),
+            'fastqc': report_links.get('fastqc'),
+            'ribometric': report_links.get('ribometric'),
         })
 
 
 def download_all(request) -> HttpResponse:
     '''
-    Download all corresponding files for the accessions in the request
+    Download a manifest of all corresponding files for the accessions in
+    the request.
+
+    The manifest is streamed from the artifact manifest, in the format
+    given by the mode parameter (see downloads.manifest_chunks), and
+    cached by selection so that repeat requests are served from the cache.
     '''
     selected = dict(request.GET.lists())
     file_type = selected.get('file_type', ['reads'])[0]
+    mode = selected.get('mode', ['sh'])[0]
+
+    file_types = download_file_types(file_type)
+    if file_types is None:
+        return HttpResponseBadRequest(f"Unknown file type: {file_type}")
+    if mode not in DOWNLOAD_MODES:
+        return HttpResponseBadRequest(f"Unknown mode: {mode}")
 
     sample_entries, _ = get_links_sample_entries(selected, request)
 
     if sample_entries is None:
         return HttpResponseNotFound("No Samples Selected")
 
-    run_accessions = sample_entries.values_list('Run', flat=True)
-    filename = str(uuid.uuid4())
-    static_base_path = "/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg/download_files"
-    filepath = f"{static_base_path}/RiboSeqOrg_Download_{filename}.sh"
-
-    bash_content = [
-        "#!/bin/bash\n\n",
-        "# Base URL\n",
-        "BASE_URL=\"https://rdp.ucc.ie\"\n\n",
-        "# Array of file paths\n",
-        "FILES=(\n"
-    ]
-
-    for accession in run_accessions:
-        formats = ["bigwig (forward)", "bigwig (reverse)"] if file_type == "bigwigs" else [file_type]
-        for file_format in formats:
-            link = generate_link(accession, file_format)
-            if link:
-                bash_content.append(f'  "{link}"\n')
-
-    if len(bash_content) > 5:  # Check if any files were added to the array
-        bash_content.extend([
-            ")\n\n",
-            "# Download function\n",
-            "download_file() {\n",
-            "  local url=\"$BASE_URL/$1\"\n",
-            "  echo \"Downloading: $url\"\n",
-            "  wget -c \"$url\"\n",
-            "}\n\n",
-            "# Main loop\n",
-            "for file in \"${FILES[@]}\"; do\n",
-            "  download_file \"$file\"\n",
-            "done\n\n",
-            "echo \"All downloads completed!\"\n"
-        ])
-    else:
-        bash_content = ["#!/bin/bash\n\n", "echo 'No files available for download'\n"]
-
-    with open(filepath, 'w') as f:
-        f.writelines(bash_content)
-
-    with open(filepath, "rb") as f:
-        mime_type, _ = mimetypes.guess_type(filepath)
-        response = HttpResponse(f, content_type=mime_type)
-        response["Content-Disposition"] = f"attachment; filename=RiboSeqOrg_Download_{filename}.sh"
-
+    selection = {
+        name: options for name, options in selected.items()
+        if name not in ['mode', 'page']
+    }
+    selection['file_type'] = [file_type]
+    chunks = manifest_chunks(
+        manifest_artifacts(sample_entries, file_types), mode)
+    content_type, _ = DOWNLOAD_MODES[mode]
+    response = StreamingHttpResponse(
+        cached_stream('downloads', mode, selection, chunks),
+        content_type=content_type,
+        )
+    response["Content-Disposition"] = (
+        f"attachment; filename={manifest_name(selection, mode)}")
     return response
 
 
@@ -1240,34 +1035,83 @@ def custom_track(request, query) -> str:
 
 
 def pivot(request):
-    random.seed(42)
-    samples = Sample.objects.all().order_by('?')# [:1000]
-    samples = pd.DataFrame.from_records(samples.values()).fillna("Missing")
-    columns2drop = ["id",'verified','Experiment','InsertDev', 'trips_id', 
-                    'gwips_id', 'ribocrypt_id', 'FASTA_file','sample_title',
-                    'MONTH', 'YEAR', 'ENA_last_update','sample_title',
-                    'ENA_checklist','ENA_first_public', 'ENA_last_update',
-                    'INSDC_center_alias', 'INSDC_center_name',
-                    'INSDC_first_public', 'INSDC_last_update', 
-                    'INSDC_status','spots','SampleName', 'CenterName',
-                    'Submission', 'BioProject_id', 'Run','SRAStudy', 
-                    'Study_Pubmed_id', 'Sample', 'BioSample','TaxID','AUTHOR',
-                    'GEO_Accession', 'Experiment_Date','date_sequenced', 
-                    'submission_date', 'date','Info']
-    samples = samples.drop(columns2drop, axis=1)
-    print(samples.columns)
-
-    samples= samples.to_csv(encoding='utf8')
-    if hasattr(samples, 'decode'):
-        samples = samples.decode('utf8')
-
-    template = loader.get_template('main/pivot.html')
+    '''
+    Render the pivot page. The page fetches grouped counts for the chosen
+    dimensions from the pivot API rather than receiving every sample.
+    '''
+    clean_names = get_clean_names()
+    return render(request, 'main/pivot.html', {
+        'dimensions': {
+            name: clean_names.get(name, name) for name in pivot_dimensions()
+        },
+        'snapshot_version': version_tag(),
+    })
 
-    context = {
-        'data': samples
-    }
 
-    return HttpResponse(template.render(context, request))
+def accepts_gzip(request) -> bool:
+    '''
+    Check whether the client accepts gzip content, honouring the quality
+    values of the Accept-Encoding header (eg. 'gzip;q=0' refuses it).
+    '''
+    qualities = {}
+    for coding in request.headers.get('Accept-Encoding', '').split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+def snapshot_etag(request) -> str:
+    # The gzip and identity bodies differ, so their tags must too
+    encoding = 'gzip' if accepts_gzip(request) else 'identity'
+    return (
+        f"pivot-{version_tag()}-{request.GET.get('format', 'json')}-"
+        f"{encoding}")
+
+
+@condition(etag_func=snapshot_etag)
+def pivot_snapshot_data(request) -> HttpResponse:
+    '''
+    Serve the pivot dataset snapshot of the current data version (see
+    pivot.build_pivot_snapshot), as JSON (default) or Arrow.
+
+    The snapshot is built once per data version and validated by an ETag
+    naming that version. Requests naming the current version with the v
+    parameter (as the pivot page does) may be cached indefinitely, since
+    new data gives a new URL; other requests are cached briefly.
+    '''
+    file_format = request.GET.get('format', 'json')
+    if file_format not in SNAPSHOT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown format: {file_format}")
+    if file_format == 'arrow' and not columnar_available():
+        return HttpResponseBadRequest(
+            "The arrow format is not available on this server")
+
+    snapshot = pivot_snapshot(file_format)
+    if accepts_gzip(request):
+        response = HttpResponse(
+            snapshot, content_type=SNAPSHOT_FORMATS[file_format])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(
+            gzip.decompress(snapshot),
+            content_type=SNAPSHOT_FORMATS[file_format])
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if request.GET.get('v') == version_tag():
+        patch_cache_control(
+            response, public=True, max_age=SNAPSHOT_IMMUTABLE_AGE,
+            immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=SNAPSHOT_MAX_AGE)
+    return response
 
 
 def vocabularies(request):
@@ -1275,24 +1119,11 @@ def vocabularies(request):
 
 
 def get_reference_data():
-    references_dir = '/home/DATA/RiboSeqOrg-DataPortal-Files/RiboSeqOrg/references'
-    reference_data = []
-
-    for organism_dir in os.listdir(references_dir):
-        organism_path = os.path.join(references_dir, organism_dir)
-        if os.path.isdir(organism_path):
-            organism_name = organism_dir.replace('_', ' ').title()
-            gtf_file = next((f for f in os.listdir(organism_path) if f.endswith('.gtf')), None)
-            fa_file = next((f for f in os.listdir(organism_path) if f.endswith('.fa')), None)
-
-            if gtf_file and fa_file:
-                reference_data.append({
-                    'name': organism_name,
-                    'gtf': os.path.join("static2", "references", organism_dir, gtf_file),
-                    'fasta': os.path.join("static2", "references", organism_dir, fa_file)
-                })
-
-    return sorted(reference_data, key=lambda x: x['name'])
+    '''
+    Return the reference files of each organism, from the cached reference
+    catalogue (see references.get_reference_catalogue).
+    '''
+    return get_reference_catalogue()['references']
 
 
 def references(request):
@@ -94,9 +94,45 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+    },
+    # The shared cache (see CACHES) has its own file, so cache writes do
+    # not lock the portal database
+    "cache": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "cache.sqlite3",
+    },
 }
 
+DATABASE_ROUTERS = ["main.routers.CacheRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Shared by every worker process: a Redis server when REDIS_URL is set
+# (configure its eviction with maxmemory-policy allkeys-lru), otherwise a
+# table in the cache database above (migrate --database cache).
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+            "OPTIONS": {
+                "serializer": "main.cache_backend.CompressedRedisSerializer",
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "main.cache_backend.SharedCache",
+            "OPTIONS": {
+                "MAX_ENTRIES": 10000,
+                "MAX_BYTES": 256 * 1024 * 1024,
+            },
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators